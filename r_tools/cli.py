@@ -202,7 +202,11 @@ def build_parser() -> argparse.ArgumentParser:
     gp.add_argument("--ff-only", action="store_true")
     gp.add_argument("--staged", action="store_true")
     gp.add_argument("--n", type=int, default=10)
+    gp.add_argument("--all-remotes", action="store_true", help="fetch/sync: hent fra alle remotes parallelt")
+    gp.add_argument("--jobs", type=int, help="Maks samtidige fetch (default: git.fetch_jobs)")
     gp.add_argument("--confirm", action="store_true", help="Bekreft handling på beskyttet branch")
+    gp.add_argument("--plain", action="store_true", help="diff/log: maskinlesbar output (uten graf/dekorasjon)")
+    gp.add_argument("--status", action="store_true", help="acp: vis 'git status -sb' etter push")
 
     # ---- list ----
     lp = sub.add_parser("list", help="Vis effektiv config / meta-info")
@@ -490,10 +494,16 @@ def main() -> None:
             "ff_only": bool(args.ff_only),
             "staged": bool(args.staged),
             "n": int(args.n),
+            "all_remotes": bool(args.all_remotes),
+            "jobs": args.jobs,
             "confirm": bool(args.confirm),
+            "pretty": not bool(args.plain),
+            "status": bool(args.status),
         }
-        out = run_git(cfg, args.action, parms)
-        print(out, end="" if out.endswith("\n") else "\n")
+        # diff/log strømmes rett til stdout; øvrige actions returnerer tekst
+        out = run_git(cfg, args.action, parms, sink=sys.stdout.write)
+        if out:
+            print(out, end="" if out.endswith("\n") else "\n")
         return
 
     if args.cmd == "list":
@@ -0,0 +1,159 @@
+# ./tools/r_tools/tools/_globs.py
+"""
+Felles hjelpere for verktøyene som traverserer selv (paste, replace):
+glob-oversetting, include-kompilering, scandir-traversering og tekst-dekoding.
+Include-globs følger Path.glob-semantikk; dette er den eneste oversetteren.
+"""
+from __future__ import annotations
+
+import fnmatch
+import functools
+import os
+import re
+from collections.abc import Collection, Iterable, Iterator
+
+# ---- fnmatch-globs (exclude/only/skip osv.) ----
+# Samme mønsterlister går igjen mellom kjøringer (webui) → oversett/kompiler én gang.
+
+@functools.lru_cache(maxsize=1024)
+def translate_glob(pat: str) -> str:
+    return fnmatch.translate(pat)
+
+def compile_globs(patterns: Iterable[str]) -> re.Pattern[str] | None:
+    """fnmatch-globs slått sammen til én regex (None hvis ingen mønstre)."""
+    pats = tuple(dict.fromkeys(p for p in patterns or [] if p))
+    if not pats:
+        return None
+    return _compile_globs_cached(pats)
+
+@functools.lru_cache(maxsize=64)
+def _compile_globs_cached(pats: tuple[str, ...]) -> re.Pattern[str]:
+    # translate() gir '(?s:...)\Z'; felles '\Z' flyttes ut av alternasjonen.
+    parts = [t[:-2] if t.endswith(r"\Z") else t for t in map(translate_glob, pats)]
+    return re.compile("(?:" + "|".join(parts) + r")\Z")
+
+# ---- include-globs (Path.glob-semantikk) ----
+
+def norm_glob(pat: str) -> str:
+    # Som Path.glob: tomme segmenter og '.' ignoreres ('./src//*.py' == 'src/*.py')
+    return "/".join(seg for seg in pat.split("/") if seg not in ("", "."))
+
+@functools.lru_cache(maxsize=256)
+def glob_to_regex(pat: str) -> str | None:
+    """
+    Oversett en include-glob til regex over relativ POSIX-sti med samme semantikk som Path.glob:
+      - '*', '?' og '[...]' matcher aldri over '/'
+      - '**/' matcher null eller flere kataloger ('**/*.py' treffer også 'a.py' i root)
+      - '**' til slutt gir bare kataloger i Path.glob → None (ingen filer)
+    """
+    pat = norm_glob(pat)
+    if not pat or pat == "**" or pat.endswith("/**"):
+        return None
+    out: list[str] = []
+    i, n = 0, len(pat)
+    while i < n:
+        if pat.startswith("**/", i) and (i == 0 or pat[i - 1] == "/"):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        c = pat[i]
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = i + 1
+            if j < n and pat[j] == "!":
+                j += 1
+            if j < n and pat[j] == "]":
+                j += 1
+            while j < n and pat[j] != "]":
+                j += 1
+            if j >= n:
+                out.append("\\[")
+            else:
+                stuff = pat[i + 1 : j].replace("\\", "\\\\")
+                if stuff.startswith("!"):
+                    stuff = "^" + stuff[1:]
+                elif stuff.startswith("^"):
+                    stuff = "\\" + stuff
+                out.append(f"[{stuff}]")
+                i = j
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+def compile_include(patterns: Iterable[str]) -> re.Pattern[str] | None:
+    """
+    Alle include-globs som én alternasjon (brukes med fullmatch).
+    Duplikater fjernes, og 'X' droppes når '**/X' også finnes (dekkes allerede).
+    None = ingen av mønstrene kan gi filer (f.eks. bare 'src/**').
+    """
+    return _compile_include_cached(tuple(dict.fromkeys(patterns)))
+
+@functools.lru_cache(maxsize=64)
+def _compile_include_cached(patterns: tuple[str, ...]) -> re.Pattern[str] | None:
+    pats = [p for p in patterns if p.startswith("**/") or f"**/{p}" not in patterns]
+    parts = [r for r in map(glob_to_regex, pats) if r is not None]
+    if not parts:
+        return None
+    return re.compile("|".join(f"(?:{r})" for r in parts))
+
+# ---- traversering ----
+
+def under_any_dir(path: str, dirs: Iterable[str]) -> bool:
+    """Ren strengsjekk: path er lik en av katalogene eller ligger under den (ingen Path-objekter)."""
+    for d in dirs:
+        if path == d or path.startswith(d + os.sep):
+            return True
+    return False
+
+def walk_files(
+    start: str,
+    rel_prefix: str = "",
+    *,
+    excl_names: Collection[str] = frozenset(),
+    excl_dirs: Collection[str] = (),
+    excl_dir_re: re.Pattern[str] | None = None,
+) -> Iterator[tuple[os.DirEntry[str], str]]:
+    """
+    Én os.scandir-traversering fra start (rel_prefix = relativ sti dit, med '/' til slutt).
+    Kataloger beskjæres før vi går ned i dem når navnet er i excl_names, stien ligger i/under
+    excl_dirs (absolutte stier), eller relativ sti ('rel' eller 'rel/') matcher excl_dir_re.
+    Gir (DirEntry, relativ POSIX-sti) for filer.
+    Symlinkede kataloger følges ikke (som '**' i Path.glob).
+    """
+    stack: list[tuple[str, str]] = [(start, rel_prefix)]
+    while stack:
+        dir_abs, dir_rel = stack.pop()
+        try:
+            it = os.scandir(dir_abs)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                rel = dir_rel + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if excl_names and entry.name in excl_names:
+                            continue
+                        if excl_dirs and under_any_dir(entry.path, excl_dirs):
+                            continue
+                        # 'rel/' fanger også 'dist/**'-formen, så filene rett under beskjæres
+                        if excl_dir_re is not None and (excl_dir_re.match(rel) or excl_dir_re.match(rel + "/")):
+                            continue
+                        stack.append((entry.path, rel + "/"))
+                    elif entry.is_file():
+                        yield entry, rel
+                except OSError:
+                    continue
+
+# ---- dekoding ----
+
+def decode_text(raw: bytes) -> str:
+    # Som read_text()/open(encoding="utf-8", errors="replace"): universelle linjeskift
+    text = raw.decode("utf-8", errors="replace")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
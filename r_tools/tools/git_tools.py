@@ -1,10 +1,25 @@
 # ./tools/r_tools/tools/git_tools.py
 from __future__ import annotations
 
+import contextvars
 import fnmatch
+import functools
+import os
+import re
+import shutil
 import subprocess
 import sys
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any
+
+try:
+    import pygit2  # type: ignore
+except Exception:
+    pygit2 = None
 
 # ────────────────────────────────────────────────────────────────────────────
 # Prosess-hjelpere
@@ -29,48 +44,254 @@ def _run_module_or_cli(module: str, args: list[str], cwd: Path) -> tuple[int, st
 # Git-hjelpere
 # ────────────────────────────────────────────────────────────────────────────
 
-def _git(cwd: Path, *args: str) -> tuple[int, str]:
-    return _run_cmd(["git", *args], cwd)
+_GIT_EXE = shutil.which("git")
+
+def _spawn(
+    cmd: list[str],
+    cwd: Path,
+    sink: Callable[[str], object] | None = None,
+    line_limit: int = 0,
+) -> tuple[int, str]:
+    """
+    Som _run_cmd, men for git på POSIX: bruker `git -C <cwd>` + absolutt sti og
+    close_fds=False slik at subprocess kan velge posix_spawn i stedet for fork+exec.
+    (cwd= slår av posix_spawn-stien; fd-er er uansett ikke-arvbare, jf. PEP 446.)
+
+    Med `sink` strømmes output linje for linje dit (og returnert tekst er tom);
+    med `line_limit` > 0 avsluttes prosessen etter så mange linjer.
+    """
+    if os.name == "posix" and _GIT_EXE and cmd[:1] == ["git"]:
+        argv = [_GIT_EXE, "-C", str(cwd), *cmd[1:]]
+        kw: dict[str, Any] = {"close_fds": False}
+    else:
+        argv = cmd
+        kw = {"cwd": str(cwd)}
+    if sink is None and line_limit <= 0:
+        proc = subprocess.run(argv, text=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **kw)
+        return proc.returncode, proc.stdout or ""
+
+    buf: list[str] = []
+    emit = sink if sink is not None else buf.append
+    with subprocess.Popen(
+        argv,
+        text=True,
+        errors="replace",
+        bufsize=1,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        **kw,
+    ) as proc:
+        assert proc.stdout is not None
+        count = 0
+        for line in proc.stdout:
+            emit(line)
+            count += 1
+            if line_limit > 0 and count >= line_limit:
+                proc.terminate()
+                break
+        rc = proc.wait()
+    return rc, "".join(buf)
+
+def _git(cwd: Path, *args: str, sink: Callable[[str], object] | None = None, line_limit: int = 0) -> tuple[int, str]:
+    return _spawn(["git", *args], cwd, sink=sink, line_limit=line_limit)
+
+# ────────────────────────────────────────────────────────────────────────────
+# pygit2 (valgfri): lesende oppslag uten prosess-oppstart
+# ────────────────────────────────────────────────────────────────────────────
+
+# libgit2-håndtak er ikke trygge å dele mellom tråder (webui kjører endepunkter i en
+# trådpool) → én cache per tråd i stedet for én delt per prosess.
+_REPO_TLS = threading.local()
+_REPO_CACHE_MAX = 32
+
+def _open_repo(root_str: str) -> Any:
+    cache: dict[str, Any] | None = getattr(_REPO_TLS, "repos", None)
+    if cache is None:
+        cache = _REPO_TLS.repos = {}
+    repo = cache.get(root_str)
+    if repo is not None:
+        return repo
+    # Kaster ved feil → negative svar caches ikke (repo kan opprettes senere)
+    git_dir = pygit2.discover_repository(root_str)
+    if not git_dir:
+        raise KeyError(root_str)
+    repo = pygit2.Repository(git_dir)
+    if repo.is_bare:
+        raise KeyError(root_str)
+    if len(cache) >= _REPO_CACHE_MAX:
+        cache.pop(next(iter(cache)))
+    cache[root_str] = repo
+    return repo
+
+def _repo(root: Path) -> Any:
+    """pygit2.Repository for root (cachet per tråd og resolved sti), eller None uten pygit2/repo."""
+    if pygit2 is None:
+        return None
+    try:
+        return _open_repo(str(Path(root).resolve()))
+    except Exception:
+        return None
+
+@dataclass
+class GitCtx:
+    """Resultat av én preflight: repo er verifisert, branch er slått opp én gang."""
+
+    root: Path
+    branch: str
+    _clean: bool | None = field(default=None, repr=False)
+
+    def is_clean(self) -> bool:
+        # Lat: kun merge trenger dette, så vi betaler ikke `git status` ellers
+        if self._clean is None:
+            self._clean = _is_clean(self.root)
+        return self._clean
+
+def _preflight(root: Path) -> GitCtx:
+    """
+    Verifiser repo og hent gjeldende branch i ett oppslag
+    (`git rev-parse --is-inside-work-tree --abbrev-ref HEAD`, eller pygit2).
+    Kaster RuntimeError hvis root ikke er et git-repo.
+    """
+    if pygit2 is not None:
+        if _repo(root) is None:
+            raise RuntimeError(f"Ikke et git-repo: {root}")
+        return GitCtx(root=root, branch=current_branch(root))
+    rc, out = _git(root, "rev-parse", "--is-inside-work-tree", "--abbrev-ref", "HEAD")
+    lines = [ln.strip() for ln in (out or "").splitlines()]
+    if "true" not in lines:
+        raise RuntimeError(f"Ikke et git-repo: {root}")
+    # rc != 0 her betyr typisk "unborn" HEAD (ingen commits ennå) → ingen branch
+    rest = lines[lines.index("true") + 1 :]
+    branch = rest[0] if rc == 0 and rest else ""
+    return GitCtx(root=root, branch=branch)
+
+# Root som allerede er verifisert av en preflight i denne konteksten (run_git/_run_action);
+# offentlige hjelpere hopper da over sin egen repo-sjekk.
+_VERIFIED_ROOT: contextvars.ContextVar[Path | None] = contextvars.ContextVar("_VERIFIED_ROOT", default=None)
+
+@contextmanager
+def _verified(root: Path) -> Iterator[None]:
+    token = _VERIFIED_ROOT.set(root)
+    try:
+        yield
+    finally:
+        _VERIFIED_ROOT.reset(token)
 
 def _ensure_repo(root: Path) -> None:
+    """Kaster RuntimeError hvis root ikke er et git-repo (gratis inne i run_git, cachet med pygit2)."""
+    if _VERIFIED_ROOT.get() == root:
+        return
+    if pygit2 is not None:
+        if _repo(root) is None:
+            raise RuntimeError(f"Ikke et git-repo: {root}")
+        return
     rc, out = _git(root, "rev-parse", "--is-inside-work-tree")
     if rc != 0 or "true" not in (out or ""):
         raise RuntimeError(f"Ikke et git-repo: {root}")
 
 def current_branch(root: Path) -> str:
+    repo = _repo(root)
+    if repo is not None:
+        try:
+            if repo.head_is_unborn:
+                return ""
+            return "HEAD" if repo.head_is_detached else repo.head.shorthand
+        except Exception:
+            return ""
     rc, out = _git(root, "rev-parse", "--abbrev-ref", "HEAD")
     return (out or "").strip() if rc == 0 else ""
 
 def _is_clean(root: Path) -> bool:
+    repo = _repo(root)
+    if repo is not None:
+        try:
+            return not repo.status()
+        except Exception:
+            pass
     rc, out = _git(root, "status", "--porcelain")
     return rc == 0 and (out.strip() == "")
 
 def list_branches(root: Path) -> list[str]:
     _ensure_repo(root)
+    repo = _repo(root)
+    if repo is not None:
+        return sorted(repo.branches.local)
     rc, out = _git(root, "branch", "--format", "%(refname:short)")
     return [ln.strip() for ln in (out or "").splitlines() if ln.strip()] if rc == 0 else []
 
+def branches_with_current(root: Path) -> tuple[list[str], str]:
+    """
+    Lokale brancher + gjeldende branch i ÉN git-prosess (for-each-ref med %(HEAD)).
+    Kaster RuntimeError hvis root ikke er et git-repo.
+    """
+    repo = _repo(root)
+    if repo is not None:
+        return sorted(repo.branches.local), current_branch(root)
+    if pygit2 is not None:
+        raise RuntimeError(f"Ikke et git-repo: {root}")
+    rc, out = _git(root, "for-each-ref", "--format=%(HEAD)%(refname:short)", "refs/heads/")
+    if rc != 0:
+        raise RuntimeError(f"Ikke et git-repo: {root}")
+    branches: list[str] = []
+    current = ""
+    for ln in (out or "").splitlines():
+        name = ln[1:].strip()
+        if not name:
+            continue
+        branches.append(name)
+        if ln.startswith("*"):
+            current = name
+    # Brancher finnes men ingen er aktiv → detached HEAD (samme som `rev-parse --abbrev-ref`)
+    if branches and not current:
+        current = "HEAD"
+    return branches, current
+
 def list_remotes(root: Path) -> list[str]:
     _ensure_repo(root)
+    repo = _repo(root)
+    if repo is not None:
+        return [r.name for r in repo.remotes]
     rc, out = _git(root, "remote")
     return [ln.strip() for ln in (out or "").splitlines() if ln.strip()] if rc == 0 else []
 
+def remote_url(root: Path, remote: str) -> str | None:
+    """URL for remote (med url.*.insteadOf anvendt, som `git remote get-url`), None hvis den ikke finnes."""
+    repo = _repo(root)
+    if repo is not None:
+        try:
+            return repo.remotes[remote].url
+        except Exception:
+            return None
+    rc, out = _git(root, "remote", "get-url", remote)
+    return (out or "").strip() if rc == 0 else None
+
 def status(root: Path) -> str:
     _ensure_repo(root)
     _, out = _git(root, "status", "-sb")
     return out
 
-def diff(root: Path, staged: bool = False) -> str:
+def diff(
+    root: Path,
+    staged: bool = False,
+    sink: Callable[[str], object] | None = None,
+    line_limit: int = 0,
+    for_display: bool = False,
+) -> str:
     _ensure_repo(root)
     args = ["diff"]
+    if not for_display:
+        # maskinlesbar: aldri ANSI-farger, selv med color.ui=always
+        args.append("--no-color")
     if staged:
         args.append("--cached")
-    _, out = _git(root, *args)
+    _, out = _git(root, *args, sink=sink, line_limit=line_limit)
     return out
 
-def log(root: Path, n: int = 10) -> str:
+def log(root: Path, n: int = 10, sink: Callable[[str], object] | None = None, for_display: bool = False) -> str:
     _ensure_repo(root)
-    _, out = _git(root, "log", f"-{n}", "--oneline", "--graph", "--decorate")
+    # --graph/--decorate koster ekstra arbeid i git; bare når output skal vises for et menneske
+    extra = ["--graph", "--decorate"] if for_display else ["--no-decorate", "--no-color"]
+    _, out = _git(root, "log", f"-{n}", "--oneline", *extra, sink=sink)
     return out
 
 def fetch(root: Path, remote: str) -> str:
@@ -78,6 +299,20 @@ def fetch(root: Path, remote: str) -> str:
     _, out = _git(root, "fetch", remote)
     return out
 
+def fetch_all(root: Path, remotes: list[str], jobs: int = 4) -> str:
+    """
+    Fetch flere remotes i ÉN git-prosess: `git fetch --multiple --jobs=N`.
+    git parallelliserer selv og skriver FETCH_HEAD/refs under egne låser; separate
+    `git fetch`-prosesser i samme repo ville kjempet om de samme lock-filene.
+    """
+    _ensure_repo(root)
+    if not remotes:
+        return "[git] Ingen remotes å hente fra.\n"
+    if len(remotes) == 1:
+        return f"[git] fetch {remotes[0]}\n" + _git(root, "fetch", remotes[0])[1]
+    _, out = _git(root, "fetch", "--multiple", f"--jobs={max(1, jobs)}", *remotes)
+    return f"[git] fetch --multiple {' '.join(remotes)}\n" + out
+
 def pull_rebase(root: Path, remote: str, branch: str, ff_only: bool = True) -> str:
     _ensure_repo(root)
     args = ["pull", "--ff-only" if ff_only else "--rebase", remote, branch]
@@ -112,7 +347,7 @@ def merge_to(root: Path, source: str, target: str, ff_only: bool = True) -> str:
         args.append("--ff-only")
     args.append(source)
     _, out2 = _git(root, *args)
-    return out + out2
+    return "".join((out, out2))
 
 def add_commit(root: Path, message: str) -> str:
     _ensure_repo(root)
@@ -120,30 +355,68 @@ def add_commit(root: Path, message: str) -> str:
         return "[git] Commit-melding kan ikke være tom.\n"
     _, out_a = _git(root, "add", "-A")
     _, out_c = _git(root, "commit", "-m", message)
-    return out_a + out_c
+    return "".join((out_a, out_c))
 
-def add_commit_push(root: Path, remote: str, branch: str, message: str) -> str:
-    txt = add_commit(root, message)
-    _, out_p = _git(root, "push", remote, branch)
-    _, out_s = _git(root, "status", "-sb")
-    return txt + out_p + out_s
+def add_commit_push(root: Path, remote: str, branch: str, message: str, want_status: bool = False) -> str:
+    parts: list[str] = [add_commit(root, message)]
+    parts.append(_git(root, "push", remote, branch)[1])
+    if want_status:
+        parts.append(_git(root, "status", "-sb")[1])
+    return "".join(parts)
 
 # ────────────────────────────────────────────────────────────────────────────
 # Beskyttede grener + pre-push-sjekk
 # ────────────────────────────────────────────────────────────────────────────
 
-def _is_protected(branch: str, patterns: list[str]) -> bool:
-    b = branch or ""
-    for pat in patterns:
-        pat = str(pat).strip()
-        if not pat:
-            continue
-        if any(x in pat for x in "*?["):
-            if fnmatch.fnmatch(b, pat):
-                return True
-        elif b == pat:
+@dataclass(frozen=True)
+class GitCfg:
+    """Normalisert git-konfig; bygges én gang per unike verdisett (se `_git_cfg`)."""
+
+    remote: str
+    base: str
+    protected: frozenset[str]
+    protected_re: re.Pattern[str] | None
+    precheck_mode: str
+    fetch_jobs: int
+
+    def is_protected(self, branch: str) -> bool:
+        b = branch or ""
+        if b in self.protected:
             return True
-    return False
+        return self.protected_re is not None and self.protected_re.match(b) is not None
+
+@functools.lru_cache(maxsize=16)
+def _make_git_cfg(
+    remote: str, base: str, patterns: tuple[str, ...], precheck_mode: str, fetch_jobs: int
+) -> GitCfg:
+    pats = [p.strip() for p in patterns if p.strip()]
+    globs = [p for p in pats if any(x in p for x in "*?[")]
+    return GitCfg(
+        remote=remote,
+        base=base,
+        protected=frozenset(p for p in pats if p not in globs),
+        protected_re=re.compile("|".join(fnmatch.translate(p) for p in globs)) if globs else None,
+        precheck_mode=precheck_mode,
+        fetch_jobs=fetch_jobs,
+    )
+
+def _git_cfg(gcfg: dict) -> GitCfg:
+    return _make_git_cfg(
+        str(gcfg.get("default_remote", "origin")),
+        str(gcfg.get("default_base", "main")),
+        tuple(str(p) for p in gcfg.get("protected_branches", ["main", "master", "release/*"])),
+        str(gcfg.get("precheck_mode") or "strict").lower(),
+        int(gcfg.get("fetch_jobs", 4)),
+    )
+
+def _require_unprotected(gc: GitCfg, branch: str, args: dict, what: str, label: str = "") -> str | None:
+    """
+    Returnerer avvisningsmelding hvis `branch` er beskyttet og confirm mangler, ellers None.
+    `label` settes foran navnet (f.eks. "Target ") så brukeren ser hvilken branch det gjelder.
+    """
+    if gc.is_protected(branch) and not bool(args.get("confirm", False)):
+        return f"[git] {label}'{branch}' er beskyttet. Sett confirm=true for {what}.\n"
+    return None
 
 def _cfg_list(v: object) -> list[str]:
     """Aksepterer både liste og kommaseparert streng."""
@@ -236,9 +509,10 @@ def pre_push_check(root: Path, cfg: dict, run_tests: bool = False, mode: str = "
 
 def stash_switch(root: Path, branch: str, message: str | None = None) -> str:
     _ensure_repo(root)
+    if not branch:
+        return "[git] Ingen branch oppgitt.\n"
     msg = message or f"ui: auto-stash before switch to {branch}"
     _git(root, "stash", "push", "-u", "-m", msg)
-    _git(root, "switch", "HEAD")
     _, out = _git(root, "switch", branch)
     return f"[git] stash push: {msg}\n" + out
 
@@ -268,37 +542,55 @@ def resolve_helper(root: Path) -> str:
         ]
     return "\n".join(guide) + "\n"
 
-def run_git(cfg: dict, action: str, args: dict) -> str:
+def run_git(cfg: dict, action: str, args: dict, sink: Callable[[str], object] | None = None) -> str:
+    """
+    Kjør en git-action. Med `sink` strømmes output fra diff/log direkte dit
+    (returverdien blir da tom) i stedet for å bygges opp som én streng.
+    """
     root = Path(cfg.get("project_root", ".")).resolve()
+    ctx = _preflight(root)
+    with _verified(root):
+        return _run_action(cfg, ctx, action, args, sink)
+
+def _run_action(
+    cfg: dict, ctx: GitCtx, action: str, args: dict, sink: Callable[[str], object] | None = None
+) -> str:
+    root = ctx.root
     gcfg = cfg.get("git") or {}
-    remote = args.get("remote") or gcfg.get("default_remote", "origin")
-    base = args.get("base") or gcfg.get("default_base", "main")
-    branch = args.get("branch") or current_branch(root)
+    gc = _git_cfg(gcfg)
+    remote = args.get("remote") or gc.remote
+    base = args.get("base") or gc.base
+    branch = args.get("branch") or ctx.branch
     ff_only = bool(args.get("ff_only", True))
+    all_remotes = bool(args.get("all_remotes", False))
+    jobs = int(args.get("jobs") or gc.fetch_jobs)
     staged = bool(args.get("staged", False))
     n = int(args.get("n", 10))
-
-    protected_patterns = list(gcfg.get("protected_branches", ["main", "master", "release/*"]))
+    max_lines = int(args.get("max_lines", 0) or 0)
+    pretty = bool(args.get("pretty", False))
+    want_status = bool(args.get("status", False))
+    mode = str(args.get("precheck_mode") or gc.precheck_mode).lower()
 
     if action == "status":
         return status(root)
     if action == "branches":
-        cur = current_branch(root)
-        return "\n".join(list_branches(root)) + (f"\n(current: {cur})\n" if cur else "\n")
+        branches, cur = branches_with_current(root)
+        return "\n".join(branches) + (f"\n(current: {cur})\n" if cur else "\n")
     if action == "remotes":
         return "\n".join(list_remotes(root)) + "\n"
     if action == "fetch":
+        if all_remotes:
+            return fetch_all(root, list_remotes(root), jobs=jobs)
         return fetch(root, remote)
     if action == "pull":
         return pull_rebase(root, remote, branch or base, ff_only=True)
     if action == "push":
-        if _is_protected(branch, protected_patterns) and not bool(args.get("confirm", False)):
-            return f"[git] '{branch}' er beskyttet. Sett confirm=true for å pushe.\n"
+        if refusal := _require_unprotected(gc, branch, args, "å pushe"):
+            return refusal
         if bool(args.get("precheck", False)):
-            mode = str(args.get("precheck_mode") or gcfg.get("precheck_mode") or "strict").lower()
             rc, txt = pre_push_check(root, cfg, bool(args.get("precheck_tests", False)), mode=mode)
             if rc != 0:
-                return txt + "Pre-push: FAILED\n[git] Pre-push sjekk feilet. Avbryter push.\n"
+                return "".join((txt, "Pre-push: FAILED\n[git] Pre-push sjekk feilet. Avbryter push.\n"))
         return push(root, remote, branch)
     if action == "switch":
         return switch(root, branch)
@@ -307,35 +599,36 @@ def run_git(cfg: dict, action: str, args: dict) -> str:
     if action == "create":
         return create_branch(root, branch, base=args.get("base"))
     if action == "merge":
-        if not _is_clean(root):
+        if not ctx.is_clean():
             return "[git] Arbeidskatalogen er ikke ren – commit/stash endringer før merge.\n"
         tgt = args.get("target") or branch or base
-        src = args.get("source") or current_branch(root)
-        if _is_protected(tgt, protected_patterns) and not bool(args.get("confirm", False)):
-            return f"[git] Target '{tgt}' er beskyttet. Sett confirm=true for å bekrefte merge.\n"
+        src = args.get("source") or ctx.branch
+        if refusal := _require_unprotected(gc, tgt, args, "å bekrefte merge", label="Target "):
+            return refusal
         return merge_to(root, src, tgt, ff_only=ff_only)
     if action == "acp":
         message = args.get("message") or ""
-        if _is_protected(branch, protected_patterns) and not bool(args.get("confirm", False)):
-            return f"[git] '{branch}' er beskyttet. Sett confirm=true for ACP.\n"
-        out = add_commit(root, message)
+        if refusal := _require_unprotected(gc, branch, args, "ACP"):
+            return refusal
+        parts: list[str] = [add_commit(root, message)]
         if bool(args.get("precheck", False)):
-            mode = str(args.get("precheck_mode") or gcfg.get("precheck_mode") or "strict").lower()
             rc, txt = pre_push_check(root, cfg, bool(args.get("precheck_tests", False)), mode=mode)
-            out += txt
+            parts.append(txt)
             if rc != 0:
-                return out + "Pre-push: FAILED\n[git] Pre-push sjekk feilet. Avbryter push.\n"
-        _, out_p = _git(root, "push", remote, branch)
-        _, out_s = _git(root, "status", "-sb")
-        return out + out_p + out_s
+                parts.append("Pre-push: FAILED\n[git] Pre-push sjekk feilet. Avbryter push.\n")
+                return "".join(parts)
+        parts.append(_git(root, "push", remote, branch)[1])
+        if want_status:
+            parts.append(_git(root, "status", "-sb")[1])
+        return "".join(parts)
     if action == "diff":
-        return diff(root, staged=staged)
+        return diff(root, staged=staged, sink=sink, line_limit=max_lines, for_display=pretty)
     if action == "log":
-        return log(root, n=n)
+        return log(root, n=n, sink=sink, for_display=pretty)
     if action == "sync":
-        txt = fetch(root, remote)
-        txt += pull_rebase(root, remote, branch or base, ff_only=True)
-        return txt
+        fetched = fetch_all(root, list_remotes(root), jobs=jobs) if all_remotes else fetch(root, remote)
+        parts = [fetched, pull_rebase(root, remote, branch or base, ff_only=True)]
+        return "".join(parts)
     if action == "resolve":
         return resolve_helper(root)
 
@@ -1,11 +1,21 @@
 # ./tools/r_tools/tools/paste_chunks.py
 from __future__ import annotations
 
+import bisect
+import functools
 import hashlib
+import os
+import pickle
 import re
+import tempfile
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from operator import itemgetter
 from pathlib import Path
+from typing import NoReturn
+
+from ._globs import compile_globs, compile_include, decode_text, walk_files
 
 @dataclass(frozen=True)
 class PasteCfg:
@@ -23,62 +33,127 @@ class PasteCfg:
     global_exclude_files: list[str]
 
 # ---------- små hjelpere ----------
-# --- First-fit pakking for paste-bøtter (med soft overflow) ---
+# --- Best-fit pakking for paste-bøtter (med soft overflow) ---
 
 @dataclass
 class PasteItem:
     """Representerer én filblokk som skal inn i en paste_XY.txt."""
 
     rel_path: str  # kun til index/logging
-    rendered: str  # hele teksten (inkl. headers/footers/kode)
-    lines: int  # antall linjer i rendered (brukes for pakking)
-
-def _first_fit_pack(items: list[PasteItem], capacity: int, soft_overflow: int = 0) -> list[list[PasteItem]]:
+    header: bytes  # header-linjene UTF-8-kodet (inkl. avsluttende newline)
+    body: bytes  # koden UTF-8-kodet (avsluttes alltid med newline)
+    lines: int  # antall linjer i header + body + footer (brukes for pakking)
+    code_lines: int = 0  # LINES-verdien i headeren (vises i index)
+    chunk: tuple[int, int] = (1, 1)  # (chunk-nr, antall chunker) (vises i index)
+
+# Header-mal og footer ferdig kodet én gang (binær skriving, ingen tekstlag)
+_HEADER_TMPL = (
+    b"===== BEGIN FILE =====\n"
+    b"PATH: %s\n"
+    b"TOTAL_LINES: %d\n"
+    b"LINES: %d\n"
+    b"CHUNK: %d/%d\n"
+    b"SHA256: %s\n"
+    b"----- BEGIN CODE -----\n"
+)
+_FOOTER = b"----- END CODE -----\n===== END FILE =====\n"
+_FOOTER_LINES = 2
+
+def _render_header(rel: str, total_lines: int, lines: int, chunk: tuple[int, int], body: bytes) -> bytes:
+    sha = _sha256_bytes(body).encode("ascii")
+    return _HEADER_TMPL % (rel.encode("utf-8"), total_lines, lines, chunk[0], chunk[1], sha)
+
+def _best_fit_pack(items: list[PasteItem], capacity: int, soft_overflow: int = 0) -> list[list[PasteItem]]:
     """
-    First-fit bin packing:
-      - Legg element i første bøtte som har plass (capacity + soft_overflow).
+    Best-fit bin packing (med items sortert synkende → Best-Fit-Decreasing):
+      - Legg element i bøtta med MINST restplass som fortsatt har plass (capacity + soft_overflow).
       - Start ny bøtte hvis ingen eksisterende har plass.
       - Elementer > (capacity + soft_overflow) får egen bøtte (vi splitter aldri filer).
+    Restplass holdes i en sortert liste (restplass, bøtte-idx) → bisect i stedet for lineært søk.
     """
-    limit_cap = max(1, int(capacity))
-    limit_soft = max(0, int(soft_overflow))
+    limit = max(1, int(capacity)) + max(0, int(soft_overflow))
 
     buckets: list[list[PasteItem]] = []
-    used: list[int] = []
+    residual: list[tuple[int, int]] = []  # sortert; lik restplass → laveste bøtte-idx først
 
     for it in items:
         # for store elementer får egen bøtte (kan overskride limit – vi splitter aldri en fil)
-        if it.lines > limit_cap + limit_soft:
+        if it.lines > limit:
             buckets.append([it])
-            used.append(it.lines)
             continue
 
-        placed = False
-        for i, u in enumerate(used):
-            if u + it.lines <= limit_cap + limit_soft:
-                buckets[i].append(it)
-                used[i] = u + it.lines
-                placed = True
-                break
-        if not placed:
+        pos = bisect.bisect_left(residual, (it.lines, -1))
+        if pos < len(residual):
+            room, bi = residual.pop(pos)
+            buckets[bi].append(it)
+            bisect.insort(residual, (room - it.lines, bi))
+        else:
             buckets.append([it])
-            used.append(it.lines)
+            bisect.insort(residual, (limit - it.lines, len(buckets) - 1))
 
     return buckets
 
+def _capacity_for_target(items: list[PasteItem], target: int, *, lo: int, hi: int, soft_overflow: int) -> int:
+    """
+    Minste kapasitet i [lo, hi] som gir <= target bøtter (binærsøk over _best_fit_pack).
+    lo = ceil(total/target) er nedre grense; hi (max_lines) er hard øvre grense –
+    går det ikke innenfor hi, brukes hi.
+    """
+    lo, hi = max(1, lo), max(1, hi)
+    if lo >= hi or len(_best_fit_pack(items, lo, soft_overflow)) <= target:
+        return min(lo, hi)
+    if len(_best_fit_pack(items, hi, soft_overflow)) > target:
+        return hi
+    # invariant: lo gir for mange bøtter, hi gir <= target
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if len(_best_fit_pack(items, mid, soft_overflow)) <= target:
+            hi = mid
+        else:
+            lo = mid
+    return hi
+
+# Stor skrivebuffer: få syscalls også når mange små filblokker skrives etter hverandre
+_WRITE_BUFSIZE = 1024 * 1024
+
 def _sha256_bytes(b: bytes) -> str:
     return hashlib.sha256(b).hexdigest()
 
-def _read_text(path: Path) -> tuple[str, int]:
-    data = path.read_text(encoding="utf-8", errors="replace")
-    return data, data.count("\n") + (0 if data.endswith("\n") else 1)
+def _clean_utf8(raw: bytes) -> bytes | None:
+    """
+    raw hvis bytene allerede er nøyaktig det tekstlesing + UTF-8-koding ville gitt
+    (gyldig UTF-8, ingen CR), ellers None. ASCII sjekkes uten dekoding.
+    """
+    if b"\r" in raw:
+        return None
+    if not raw.isascii():
+        try:
+            raw.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+    return raw
 
-def _is_binary(path: Path) -> bool:
+def _read_if_text(path: str, allow_binary: bool) -> bytes | None:
+    """
+    Binær-sjekk + lesing for én fil med ÉN open; None hvis filen skal hoppes over (binær).
+    Leser først 4 KiB for binær-sjekken; resten leses kun for godkjente filer,
+    så avviste binærfiler aldri leses ut over de første 4 KiB.
+    """
+    if allow_binary:
+        with open(path, "rb") as f:
+            return f.read()
     try:
-        chunk = path.read_bytes()[:4096]
-    except Exception:
-        return True
-    return b"\x00" in chunk
+        with open(path, "rb") as f:
+            head = f.read(4096)
+            if b"\x00" in head:
+                return None
+            if len(head) < 4096:
+                return head  # hele filen er allerede lest
+            # større fil: les alt på nytt i ett kall (4 KiB fra sidecache er billigere enn head + rest-kopi)
+            f.seek(0)
+            return f.read()
+    except OSError:
+        return None  # uleselig regnes som binær
 
 def _normalize_globs(globs: Iterable[str], *, filename_search: bool) -> list[str]:
     """
@@ -102,28 +177,23 @@ def _normalize_globs(globs: Iterable[str], *, filename_search: bool) -> list[str
             out.append(f"**/{s}")
         else:
             out.append(s)
-    return out
-
-def _match_any_rel(patterns: list[str], rel_posix: str) -> bool:
-    import fnmatch
-
-    for pat in patterns or []:
-        if fnmatch.fnmatch(rel_posix, pat):
-            return True
-    return False
+    # dedupe med bevart rekkefølge: samme mønster kompileres/testes bare én gang
+    return list(dict.fromkeys(out))
 
 # ---- exclude_dirs: del opp i (1) navn, (2) sti-baser, (3) globs ----
 
-def _split_dir_excludes(root: Path, items: Iterable[str]) -> tuple[list[str], list[Path], list[str]]:
+def _split_dir_excludes(root: Path, items: Iterable[str]) -> tuple[frozenset[str], tuple[str, ...], list[str]]:
     """
     Returnerer:
       - names:   rene katalognavn uten / og uten wildcard (eks: '__pycache__', '.git')
-      - bases:   bestemte katalogstier (absolutte eller relative til root) uten wildcard
-      - globs:   globs som matcher relativ katalog-sti (eks: 'dist/**', 'build*')
+      - bases:   bestemte katalogstier (absolutte eller relative til root) uten wildcard,
+                 som str(Path) – normalisert én gang for ren prefiks-sjekk i walkeren
+      - globs:   globs som matcher relativ katalog-sti (eks: 'dist/**', 'build*');
+                 testes kun mot kataloger under traverseringen – fil-globs hører hjemme i exclude_files
     NB: ingen resolve(); vi vil ikke følge symlinker.
     """
     names: list[str] = []
-    bases: list[Path] = []
+    bases: list[str] = []
     globs: list[str] = []
     for raw in items or []:
         s = str(raw).strip()
@@ -136,46 +206,21 @@ def _split_dir_excludes(root: Path, items: Iterable[str]) -> tuple[list[str], li
         elif not has_wild:
             # sti uten wildcard → base
             p = Path(s)
-            bases.append(p if p.is_absolute() else (root / p))
+            bases.append(str(p if p.is_absolute() else (root / p)))
         else:
             # glob (matcher mot relativ sti)
             globs.append(s)
-    return names, bases, globs
-
-def _under_any_base(path: Path, bases: list[Path]) -> bool:
-    for b in bases:
-        try:
-            path.relative_to(b)
-            return True
-        except Exception:
-            continue
-    return False
-
-def _has_any_dirname(path_under_root: Path, names: list[str]) -> bool:
-    # Sjekk om noen av delene i den RELATIVE stien er i names
-    for part in path_under_root.parts:
-        if part in names:
-            return True
-    return False
-
-def _iter_include_candidates(root: Path, include: list[str]) -> Iterable[Path]:
-    """
-    Iterator over kandidater fra include-globs. Returnerer *absolutte* stier,
-    men uten å resolve symlinker.
-    """
-    seen: set[Path] = set()
-    for pat in include:
-        for p in root.glob(pat):
-            if p.is_file():
-                if p not in seen:
-                    seen.add(p)
-                    yield p
+    return frozenset(names), tuple(bases), globs
 
 def _effective_include_list(pcfg: PasteCfg) -> list[str]:
     # Hvis include er tom, fall tilbake til bred default (“alle filer med punktum”)
     return pcfg.include or ["*.*", "**/*.*"]
 
-def _gather_files(pcfg: PasteCfg) -> list[Path]:
+def _gather_files(pcfg: PasteCfg) -> list[tuple[str, str]]:
+    """
+    Returnerer (absolutt sti, relativ POSIX-sti) sortert på relativ sti.
+    Relativ sti beregnes én gang under traverseringen; ingen resolve()/relative_to per fil.
+    """
     root = pcfg.project_root
 
     include_globs = _normalize_globs(_effective_include_list(pcfg), filename_search=pcfg.filename_search)
@@ -185,51 +230,220 @@ def _gather_files(pcfg: PasteCfg) -> list[Path]:
 
     # Globale ekskluderinger (kataloger og filer)
     dir_names, dir_bases, dir_globs = _split_dir_excludes(root, pcfg.global_exclude_dirs)
+    dir_globs_re = compile_globs(dir_globs)
     # Global exclude files: basenavn vs globs på relativ filsti
     g_rel_file_globs = [g for g in (pcfg.global_exclude_files or []) if any(ch in g for ch in "*?[]")]
-    g_rel_file_names = set(g for g in (pcfg.global_exclude_files or []) if not any(ch in g for ch in "*?[]"))
-
-    # Kandidater fra include
-    cands = list(_iter_include_candidates(root, include_globs))
-    files: list[Path] = []
-    for p in cands:
-        # relativ sti (uten resolve)
-        try:
-            rel = p.relative_to(root)
-        except Exception:
-            # Utenfor root? hopp over for sikkerhets skyld
-            continue
-        rel_posix = rel.as_posix()
-
-        # --- katalog-ekscluderinger ---
-        # 1) navn hvor som helst i stien
-        if _has_any_dirname(rel.parent, dir_names):
-            continue
-        # 2) under spesifikk base-katalog
-        if _under_any_base(p.parent, dir_bases):
-            continue
-        # 3) matcher relativ katalog-glob (sjekk mappen, og hele rel-stien for sikkerhet)
-        if _match_any_rel(dir_globs, rel.parent.as_posix()) or _match_any_rel(dir_globs, rel_posix):
-            continue
-
+    g_rel_file_names = frozenset(g for g in (pcfg.global_exclude_files or []) if not any(ch in g for ch in "*?[]"))
+    is_excluded_name = g_rel_file_names.__contains__
+
+    # '**/*' = alle filer → ingen include-test per fil; ellers én samlet regex
+    # (None fra compile_include = ingen mønstre kan gi filer → ingenting tas med)
+    match_all = "**/*" in include_globs
+    include_re = None if match_all else compile_include(include_globs)
+    if include_re is None and not match_all:
+        return []
+    g_rel_file_re = compile_globs(g_rel_file_globs)
+    exclude_re = compile_globs(exclude_globs)
+    only_re = compile_globs(only_globs)
+    skip_re = compile_globs(skip_globs)
+
+    # Én traversering; katalog-ekskluderinger (navn/base/glob) beskjærer treet underveis
+    found: list[tuple[str, str]] = []
+    # Billigste sjekk først: filnavn-sett (O(1)) før regexene; tomme filtre hoppes helt over
+    walk = walk_files(str(root), excl_names=dir_names, excl_dirs=dir_bases, excl_dir_re=dir_globs_re)
+    for entry, rel_posix in walk:
         # --- globale fil-ekscluderinger ---
-        if p.name in g_rel_file_names:
+        if g_rel_file_names and is_excluded_name(entry.name):
             continue
-        if _match_any_rel(g_rel_file_globs, rel_posix):
+        if include_re is not None and include_re.fullmatch(rel_posix) is None:
+            continue
+        if g_rel_file_re is not None and g_rel_file_re.match(rel_posix):
             continue
 
         # --- lokale exclude/only/skip ---
-        if _match_any_rel(exclude_globs, rel_posix):
+        if exclude_re is not None and exclude_re.match(rel_posix):
             continue
-        if only_globs and not _match_any_rel(only_globs, rel_posix):
+        if only_re is not None and not only_re.match(rel_posix):
             continue
-        if skip_globs and _match_any_rel(skip_globs, rel_posix):
+        if skip_re is not None and skip_re.match(rel_posix):
             continue
 
-        files.append(p)
+        found.append((entry.path, rel_posix))
+
+    # Deterministisk sortering på relativ sti
+    found.sort(key=itemgetter(1))
+    return found
+
+# Tomlinje = kun whitespace (samme som str.strip() == ""); én regex-sub i C i stedet for linjelister.
+# Starter på literal '\n' så regex-motoren kan hoppe rett til neste linjeskift.
+_BLANK_RUN = re.compile(r"\n(?:[^\S\n]*\n)+")
+# Linjeskift str.splitlines() kjenner i tillegg til '\n' (CR er allerede normalisert bort)
+_OTHER_LINE_SEPS = ("\v", "\f", "\x1c", "\x1d", "\x1e", "\x85", "\u2028", "\u2029")
+
+def _apply_blank_policy(text: str, policy: str) -> str:
+    """
+    "drop": fjern alle tomlinjer. "collapse": maks én tomlinje på rad
+    (en avsluttende tomlinje-rekke forsvinner). Resultatet avsluttes med newline.
+    """
+    if any(sep in text for sep in _OTHER_LINE_SEPS):
+        # sjeldne linjeskift-tegn: behold splitlines-semantikken eksakt
+        lines = text.splitlines()
+        if policy == "drop":
+            lines = [ln for ln in lines if ln.strip() != ""]
+        else:
+            out_lines: list[str] = []
+            blank_streak = 0
+            for ln in lines:
+                if ln.strip() == "":
+                    blank_streak += 1
+                    if blank_streak <= 1:
+                        out_lines.append("")
+                else:
+                    blank_streak = 0
+                    out_lines.append(ln)
+            lines = out_lines
+        text = "\n".join(lines)
+        return text if text.endswith("\n") else text + "\n"
+    # Ledende '\n' gjør at tomlinjer helt først også fanges av _BLANK_RUN; fjernes etterpå
+    text = "\n" + text if text.endswith("\n") else "\n" + text + "\n"
+    if policy == "drop":
+        return _BLANK_RUN.sub("\n", text)[1:] or "\n"
+    text = _BLANK_RUN.sub("\n\n", text)[1:]
+    # en avsluttende tomlinje-rekke forsvinner (som "\n".join + avsluttende newline)
+    return text[:-1] if text.endswith("\n\n") else text
+
+# ---- blokk-cache mellom kjøringer (opt-in: paste.cache = true) ----
+#
+# Ligger utenfor out_dir (default $XDG_CACHE_HOME/r_tools, ellers ~/.cache/r_tools), én fil per
+# prosjekt-root. En fil regnes som uendret når (inode, mtime_ns, ctime_ns, størrelse) er lik.
+# ctime kan ikke settes tilbake av brukerverktøy (touch/cp -p/rsync -t), så en omskriving
+# oppdages selv om mtime og størrelse gjenopprettes. Det som IKKE oppdages: endringer uten
+# ctime-oppdatering (f.eks. filsystemer uten ctime, eller at systemklokken stilles tilbake).
+# Er du i tvil: slå av cachen eller slett cache-filen.
+
+_CACHE_VERSION = 2
+
+def _cache_file(root: Path, cache_dir: str | None) -> Path:
+    if cache_dir:
+        base = Path(cache_dir).expanduser()
+    else:
+        xdg = os.environ.get("XDG_CACHE_HOME")
+        base = (Path(xdg) if xdg else Path.home() / ".cache") / "r_tools"
+    tag = hashlib.sha1(str(root).encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    return base / f"paste_{tag}.pkl"
+
+class _PlainUnpickler(pickle.Unpickler):
+    """Cachen inneholder kun innebygde typer; nekt å laste klasser/funksjoner."""
 
-    # Deterministisk sortering (uten resolve)
-    return sorted(files, key=lambda x: x.relative_to(root).as_posix())
+    def find_class(self, module: str, name: str) -> NoReturn:
+        raise pickle.UnpicklingError(f"uventet type i paste-cache: {module}.{name}")
+
+def _load_cache(path: Path) -> dict[str, tuple]:
+    try:
+        with path.open("rb") as f:
+            data = _PlainUnpickler(f).load()
+    except Exception:
+        return {}
+    if not isinstance(data, dict) or data.get("version") != _CACHE_VERSION:
+        return {}
+    entries = data.get("entries")
+    return entries if isinstance(entries, dict) else {}
+
+def _save_cache(path: Path, entries: dict[str, tuple]) -> None:
+    # Atomisk: unik temp-fil (mkstemp) og bytt inn – samtidige kjøringer skriver ikke over hverandre
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    except OSError:
+        return
+    tmp = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb", buffering=_WRITE_BUFSIZE) as f:
+            pickle.dump({"version": _CACHE_VERSION, "entries": entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+
+@functools.lru_cache(maxsize=16)
+def _chunk_re(n: int) -> re.Pattern[str]:
+    # inntil n linjer per treff (hver avsluttet med '\n')
+    return re.compile(r"(?:[^\n]*\n){1,%d}" % n)
+
+def _split_lines(text: str, n: int) -> list[str]:
+    """
+    Del tekst (som slutter med '\n') i biter à maks n linjer direkte fra `text`,
+    uten en mellomliste med én streng per linje.
+    """
+    if any(sep in text for sep in _OTHER_LINE_SEPS):
+        # sjeldne linjeskift-tegn: behold splitlines-semantikken eksakt
+        lines = text.splitlines(keepends=True)
+        return ["".join(lines[i : i + n]) for i in range(0, len(lines), n)]
+    return _chunk_re(n).findall(text)
+
+def _build_items(
+    rel: str, raw: bytes, *, blank_policy: str, allow_split: bool, split_chunk_lines: int
+) -> list[PasteItem]:
+    """Lag ferdige PasteItem-blokker (én, eller flere ved splitting) for én fil."""
+    items: list[PasteItem] = []
+
+    # Hurtigvei: "keep" + ren UTF-8 uten CR → bytene fra disk ER kodeblokken (ingen decode/encode)
+    clean = _clean_utf8(raw) if blank_policy not in ("drop", "collapse") else None
+    if clean is not None:
+        body = clean if clean.endswith(b"\n") else clean + b"\n"
+        code_line_count = body.count(b"\n")
+        # tekst trengs kun hvis filen skal splittes
+        text = body.decode("utf-8") if allow_split and 0 < split_chunk_lines < code_line_count else ""
+    else:
+        body = b""
+        text = decode_text(raw)
+
+        # --- komprimer tomlinjer i KODE etter ønske ---
+        if blank_policy in ("drop", "collapse"):
+            text = _apply_blank_policy(text, blank_policy)
+        # sørg for avsluttende newline for kodeblokk
+        if not text.endswith("\n"):
+            text += "\n"
+
+        # rapporter linjer ETTER eventuell komprimering (practical for packing)
+        code_line_count = text.count("\n")  # counts trailing newline as line -> that's intended
+
+    # Hvis splitting er aktivert OG kodelinjer overstiger split_chunk_lines => split
+    if allow_split and split_chunk_lines > 0 and code_line_count > split_chunk_lines:
+        # del kode-delen i chunker med maks split_chunk_lines per chunk
+        chunks = _split_lines(text, split_chunk_lines)
+        total_chunks = len(chunks)
+        for ci, chunk_text in enumerate(chunks, start=1):
+            # sørg for newline på chunk (split-preserving)
+            if not chunk_text.endswith("\n"):
+                chunk_text += "\n"
+            chunk_lines = chunk_text.count("\n")
+            # kod én gang: samme bytes hashes og skrives
+            body = chunk_text.encode("utf-8", errors="replace")
+            head = _render_header(rel, code_line_count, chunk_lines, (ci, total_chunks), body)
+            # linjetall aritmetisk; blokken settes ikke sammen før skriving
+            block_lines = head.count(b"\n") + chunk_lines + _FOOTER_LINES
+            items.append(
+                PasteItem(
+                    rel_path=rel,
+                    header=head,
+                    body=body,
+                    lines=block_lines,
+                    code_lines=chunk_lines,
+                    chunk=(ci, total_chunks),
+                )
+            )
+        return items
+
+    # Ikke split: lag vanlig item (ingen splitting)
+    if clean is None:
+        # kod én gang: samme bytes hashes og skrives
+        body = text.encode("utf-8", errors="replace")
+    head = _render_header(rel, code_line_count, code_line_count, (1, 1), body)
+    block_lines = head.count(b"\n") + code_line_count + _FOOTER_LINES
+    items.append(
+        PasteItem(rel_path=rel, header=head, body=body, lines=block_lines, code_lines=code_line_count)
+    )
+    return items
 
 # ---------- hovedfunksjon ----------
 
@@ -248,6 +462,9 @@ def run_paste(cfg: dict, list_only: bool = False) -> None:
             blank_lines: "keep"|"collapse"|"drop"  -> håndtering av tomlinjer i KODE
             allow_split: bool         -> tillat splitting av store filer
             split_chunk_lines: int   -> maks linjer per chunk når split brukes
+            cache: bool               -> gjenbruk blokker for uendrede filer mellom kjøringer (default av;
+                                         se kommentaren ved _CACHE_VERSION for når en fil regnes som uendret)
+            cache_dir: str            -> katalog for cache-filen (default $XDG_CACHE_HOME/r_tools eller ~/.cache/r_tools)
     """
     root = Path(cfg.get("project_root", ".")).resolve()
     pc = cfg.get("paste", {}) or {}
@@ -281,104 +498,57 @@ def run_paste(cfg: dict, list_only: bool = False) -> None:
     if list_only:
         print(f"Prosjekt: {root}")
         print(f"Antall filer: {len(files)}")
-        for f in files:
-            try:
-                print(f.relative_to(root).as_posix())
-            except Exception:
-                print(str(f))
+        for _, rel in files:
+            print(rel)
         return
 
     pcfg.out_dir.mkdir(parents=True, exist_ok=True)
 
     # --- Bygg fulle filblokker (med headers/footers) som PasteItem ---
     items: list[PasteItem] = []
-    total_item_lines = 0  # summen av blokklinjer (inkl. header/footer)
 
-    for file_path in files:
+    # Blokk-cache: (inode, mtime_ns, ctime_ns, størrelse, rel, opsjoner) uendret → gjenbruk ferdige blokker
+    use_cache = bool(pc.get("cache", False))
+    cache_path = _cache_file(root, pc.get("cache_dir"))
+    old_cache = _load_cache(cache_path) if use_cache else {}
+    new_cache: dict[str, tuple] = {}
+    opts = (blank_policy, allow_split, split_chunk_lines, pcfg.allow_binary)
+
+    # Les + bygg blokker parallelt (lesing og sha256 frigjør GIL); ex.map bevarer rekkefølgen
+    def _load(fr: tuple[str, str]) -> list[PasteItem]:
+        abs_path, rel = fr
+        key = None
+        if use_cache:
+            try:
+                st = os.stat(abs_path)
+                key = (st.st_ino, st.st_mtime_ns, st.st_ctime_ns, st.st_size, rel, opts)
+            except OSError:
+                key = None
+            hit = old_cache.get(abs_path)
+            if key is not None and hit is not None and hit[0] == key:
+                new_cache[abs_path] = hit
+                return [PasteItem(*t) for t in hit[1]]
+        raw = _read_if_text(abs_path, pcfg.allow_binary)
         # hopp binærfiler hvis ikke tillatt
-        if not pcfg.allow_binary and _is_binary(file_path):
-            continue
-
-        try:
-            rel = file_path.relative_to(root).as_posix()
-        except Exception:
-            # kan ikke relativisere – hopp over
-            continue
-
-        text, orig_code_lines = _read_text(file_path)
-
-        # --- komprimer tomlinjer i KODE etter ønske ---
-        if blank_policy in ("drop", "collapse"):
-            lines = text.splitlines()
-            if blank_policy == "drop":
-                lines = [ln for ln in lines if ln.strip() != ""]
-            else:  # "collapse" -> maks 1 tomlinje
-                out_lines: list[str] = []
-                blank_streak = 0
-                for ln in lines:
-                    if ln.strip() == "":
-                        blank_streak += 1
-                        if blank_streak <= 1:
-                            out_lines.append("")
-                    else:
-                        blank_streak = 0
-                        out_lines.append(ln)
-                lines = out_lines
-            text = "\n".join(lines)
-        # sørg for avsluttende newline for kodeblokk
-        if not text.endswith("\n"):
-            text += "\n"
-
-        # rapporter linjer ETTER eventuell komprimering (practical for packing)
-        code_line_count = text.count("\n")  # counts trailing newline as line -> that's intended
-
-        footer = ["----- END CODE -----", "===== END FILE ====="]
-
-        # Hvis splitting er aktivert OG kodelinjer overstiger split_chunk_lines => split
-        if allow_split and split_chunk_lines > 0 and code_line_count > split_chunk_lines:
-            # del kode-delen i chunker med maks split_chunk_lines per chunk
-            lines_with_end = text.splitlines(keepends=True)
-            chunks = [ "".join(lines_with_end[i:i+split_chunk_lines]) for i in range(0, len(lines_with_end), split_chunk_lines) ]
-            total_chunks = len(chunks)
-            for ci, chunk_text in enumerate(chunks, start=1):
-                # sørg for newline på chunk (split-preserving)
-                if not chunk_text.endswith("\n"):
-                    chunk_text += "\n"
-                chunk_lines = chunk_text.count("\n")
-                sha_chunk = _sha256_bytes(chunk_text.encode("utf-8", errors="replace"))
-                header = [
-                    "===== BEGIN FILE =====",
-                    f"PATH: {rel}",
-                    f"TOTAL_LINES: {code_line_count}",
-                    f"LINES: {chunk_lines}",
-                    f"CHUNK: {ci}/{total_chunks}",
-                    f"SHA256: {sha_chunk}",
-                    "----- BEGIN CODE -----",
-                ]
-                rendered = "\n".join(header) + "\n" + chunk_text + "\n".join(footer) + "\n"
-                block_lines = rendered.count("\n")
-                total_item_lines += block_lines
-                items.append(PasteItem(rel_path=rel, rendered=rendered, lines=block_lines))
-            # ferdig med denne filen
-            continue
-
-        # Ikke split: lag vanlig item (ingen splitting)
-        sha = _sha256_bytes(text.encode("utf-8", errors="replace"))
-        header = [
-            "===== BEGIN FILE =====",
-            f"PATH: {rel}",
-            f"TOTAL_LINES: {code_line_count}",
-            f"LINES: {code_line_count}",
-            "CHUNK: 1/1",
-            f"SHA256: {sha}",
-            "----- BEGIN CODE -----",
-        ]
-        rendered = "\n".join(header) + "\n" + text + "\n".join(footer) + "\n"
-        block_lines = rendered.count("\n")
-        total_item_lines += block_lines
-        items.append(PasteItem(rel_path=rel, rendered=rendered, lines=block_lines))
-
-    # FFD (sortér m. fallende størrelse for bedre packing)
+        built = [] if raw is None else _build_items(
+            rel, raw, blank_policy=blank_policy, allow_split=allow_split, split_chunk_lines=split_chunk_lines
+        )
+        if key is not None:
+            new_cache[abs_path] = (
+                key, [(it.rel_path, it.header, it.body, it.lines, it.code_lines, it.chunk) for it in built]
+            )
+        return built
+
+    workers = min(32, (os.cpu_count() or 1) * 4, max(1, len(files)))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for built in ex.map(_load, files):
+            items.extend(built)
+    total_item_lines = sum(it.lines for it in items)  # summen av blokklinjer (inkl. header/footer)
+    if use_cache:
+        # kun filer fra denne kjøringen beholdes → cachen vokser ikke ubegrenset
+        _save_cache(cache_path, new_cache)
+
+    # BFD (sortér m. fallende størrelse for bedre packing)
     items.sort(key=lambda it: it.lines, reverse=True)
 
     # --- Finn kapasitet og pakk ---
@@ -390,11 +560,14 @@ def run_paste(cfg: dict, list_only: bool = False) -> None:
         if target_files and target_files > 0:
             ideal = max(1, math.ceil(total_item_lines / target_files))
             # hold max_lines som øvre hard grense med mindre soft_overflow tillater overskridelse
-            capacity = min(ideal, int(pcfg.max_lines))
+            capacity = _capacity_for_target(
+                items, target_files, lo=min(ideal, int(pcfg.max_lines)), hi=int(pcfg.max_lines),
+                soft_overflow=soft_overflow,
+            )
         else:
             capacity = int(pcfg.max_lines)
 
-        buckets = _first_fit_pack(items, capacity, soft_overflow=soft_overflow)
+        buckets = _best_fit_pack(items, capacity, soft_overflow=soft_overflow)
 
     # --- Skriv ut bøttene som paste_01.txt, paste_02.txt, ... + lag index.txt ---
     written: list[tuple[Path, int]] = []
@@ -405,22 +578,13 @@ def run_paste(cfg: dict, list_only: bool = False) -> None:
     for idx, bucket in enumerate(buckets, start=1):
         paste_path = pcfg.out_dir / f"paste_{idx:02d}.txt"
         section_rows: list[tuple[str,int]] = []
-        with paste_path.open("w", encoding="utf-8") as fh:
-            for it in bucket:
-                fh.write(it.rendered)
-                # hent LINES og CHUNK for visning i index
-                try:
-                    m_lines = re.search(r"^LINES:\s+(\d+)$", it.rendered, flags=re.M)
-                    code_lines = int(m_lines.group(1)) if m_lines else 0
-                except Exception:
-                    code_lines = 0
-                # finn chunk info (valgfritt for visning)
-                m_chunk = re.search(r"^CHUNK:\s*(\d+)\/(\d+)", it.rendered, flags=re.M)
-                if m_chunk:
-                    disp = f"{it.rel_path} ({m_chunk.group(1)}/{m_chunk.group(2)})"
-                else:
-                    disp = it.rel_path
-                section_rows.append((disp, code_lines))
+        # header/body/footer strømmes rett ut → én writelines per bøtte gjennom stor buffer
+        with paste_path.open("wb", buffering=_WRITE_BUFSIZE) as fh:
+            fh.writelines(part for it in bucket for part in (it.header, it.body, _FOOTER))
+        # LINES og CHUNK for index ligger allerede som felt på elementet
+        section_rows.extend(
+            (f"{it.rel_path} ({it.chunk[0]}/{it.chunk[1]})", it.code_lines) for it in bucket
+        )
         lines_this = sum(it.lines for it in bucket)
         total_lines_written += lines_this
         written.append((paste_path, lines_this))
@@ -433,23 +597,24 @@ def run_paste(cfg: dict, list_only: bool = False) -> None:
     # Skriv index.txt med nytt format: seksjonsvis (Del X av totalt Y deler:)
     idx_path = pcfg.out_dir / "index.txt"
     total_paste_files = len(written)
-    with idx_path.open("w", encoding="utf-8") as fh:
-        fh.write("# index over innhold i paste_*.txt\n")
-        fh.write("# Format per seksjon:\n")
-        fh.write("# Del <pastefile_number> av totalt <tpastefile_number> deler:\n")
-        fh.write("# <relativ/path> | <linjer>\n\n")
-        for i, section in enumerate(index_sections, start=1):
-            fh.write(f"Del {i} av totalt {total_paste_files} deler:\n")
-            for rel_disp, ln in section:
-                fh.write(f"{rel_disp}  |  {ln} linjer\n")
-            fh.write("\n")
-        fh.write("\n# Genererte filer:\n")
-        for p, _ in written:
-            fh.write(p.name + "\n")
-        # total filer = antall oppføringer i sections
-        total_entries = sum(len(s) for s in index_sections)
-        fh.write(f"\nTotalt filer: {total_entries}\n")
-        fh.write(f"Antall paste-filer: {len(written)}\n")
+    # Bygg hele indexen som én liste og skriv med ett kall (én UTF-8-koding)
+    parts: list[str] = [
+        "# index over innhold i paste_*.txt\n",
+        "# Format per seksjon:\n",
+        "# Del <pastefile_number> av totalt <tpastefile_number> deler:\n",
+        "# <relativ/path> | <linjer>\n\n",
+    ]
+    for i, section in enumerate(index_sections, start=1):
+        parts.append(f"Del {i} av totalt {total_paste_files} deler:\n")
+        parts.extend(f"{rel_disp}  |  {ln} linjer\n" for rel_disp, ln in section)
+        parts.append("\n")
+    parts.append("\n# Genererte filer:\n")
+    parts.extend(p.name + "\n" for p, _ in written)
+    # total filer = antall oppføringer i sections
+    total_entries = sum(len(s) for s in index_sections)
+    parts.append(f"\nTotalt filer: {total_entries}\n")
+    parts.append(f"Antall paste-filer: {len(written)}\n")
+    idx_path.write_bytes("".join(parts).encode("utf-8"))
 
     # Slutt-rapport til stdout (for UI)
     print("\n== Oppsummering ==")
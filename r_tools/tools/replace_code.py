@@ -2,13 +2,20 @@
 from __future__ import annotations
 
 import difflib
-import fnmatch
+import functools
+import os
 import re
-from collections.abc import Iterable
+import shutil
+import sys
+import tempfile
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
+from ._globs import compile_globs, compile_include, decode_text, glob_to_regex, norm_glob, under_any_dir, walk_files
+
 @dataclass(frozen=True)
 class ReplaceConfig:
     project_root: Path
@@ -23,6 +30,12 @@ class ReplaceConfig:
     # Global excludes fra global_config.json
     global_exclude_dirs: list[str]
     global_exclude_files: list[str]
+    # Ferdigkompilerte glob-regexer (bygget én gang i _read_cfg, brukes per fil i _iter_candidates)
+    include_re: re.Pattern[str] | None = None
+    include_suffixes: tuple[str, ...] | None = None  # satt når alle include er '**/*<suffiks>'
+    exclude_re: re.Pattern[str] | None = None
+    g_exclude_files_re: re.Pattern[str] | None = None
+    g_exclude_names: frozenset[str] = frozenset()
 
 def _listify(v: object) -> list[str]:
     if v is None:
@@ -81,6 +94,7 @@ def _read_cfg(cfg: dict, args_overrides: dict | None) -> ReplaceConfig:
         ]
     # dersom exclude ikke er satt i config: tom liste (globale tar uansett)
     exclude = list(exclude or [])
+    g_rel_globs, g_rel_names = _split_rel_globs_vs_names(g_excl_files)
     return ReplaceConfig(
         project_root=root,
         include=include,
@@ -93,6 +107,11 @@ def _read_cfg(cfg: dict, args_overrides: dict | None) -> ReplaceConfig:
         show_diff=show_diff,
         global_exclude_dirs=g_excl_dirs,
         global_exclude_files=g_excl_files,
+        include_re=compile_include(include),
+        include_suffixes=_include_suffixes(include),
+        exclude_re=compile_globs(exclude),
+        g_exclude_files_re=compile_globs(g_rel_globs),
+        g_exclude_names=g_rel_names,
     )
 
 def _build_abs_excluded_dirs(root: Path, exclude_dirs: list[str]) -> list[Path]:
@@ -102,64 +121,131 @@ def _build_abs_excluded_dirs(root: Path, exclude_dirs: list[str]) -> list[Path]:
         out.append((p if p.is_absolute() else (root / p)).resolve())
     return out
 
-def _should_skip_by_dirs(root: Path, abs_excl_dirs: list[Path], p: Path) -> bool:
-    parent = p.parent
-    for ex in abs_excl_dirs:
-        try:
-            parent.resolve().relative_to(ex)
-            return True
-        except Exception:
-            continue
-    return False
-
-def _split_rel_globs_vs_names(exclude_files: list[str]) -> tuple[list[str], list[str]]:
+def _split_rel_globs_vs_names(exclude_files: list[str]) -> tuple[list[str], frozenset[str]]:
     rel_globs = [g for g in exclude_files if any(ch in g for ch in "*?[]")]
-    rel_names = [g for g in exclude_files if not any(ch in g for ch in "*?[]")]
+    rel_names = frozenset(g for g in exclude_files if not any(ch in g for ch in "*?[]"))
     return rel_globs, rel_names
 
-def _iter_candidates(cfg: ReplaceConfig) -> Iterable[Path]:
+def _split_glob(pat: str) -> tuple[str, str]:
+    """
+    Del en glob i (literal katalog-base, rest). Basen er segmentene før første jokertegn
+    ('' = root), f.eks. 'src/app/**/*.py' → ('src/app', '**/*.py').
+    """
+    segs = norm_glob(pat).split("/")
+    k = 0
+    while k < len(segs) - 1 and not any(ch in segs[k] for ch in "*?["):
+        k += 1
+    return "/".join(segs[:k]), "/".join(segs[k:])
+
+def _walk_bases(patterns: list[str]) -> list[str]:
+    """Katalogene traverseringen må starte i: én per literal base, nøstede baser slås sammen."""
+    bases = sorted({_split_glob(p)[0] for p in patterns if glob_to_regex(p) is not None})
+    if "" in bases:
+        return [""]
+    out: list[str] = []
+    for b in bases:
+        if ".." in b.split("/"):
+            continue  # utenfor root – Path.glob ga heller ingen gyldige kandidater
+        if not any(b.startswith(k + "/") for k in out):
+            out.append(b)
+    return out
+
+def _include_suffixes(patterns: list[str]) -> tuple[str, ...] | None:
+    """
+    Når alle include-globs er '**/*<suffiks>' uten jokertegn (standardlisten: '**/*.py', …),
+    er include-testen bare rel.endswith(suffikser) – ett C-kall i stedet for regex.
+    None ellers.
+    """
+    out: list[str] = []
+    for p in patterns:
+        sfx = norm_glob(p).removeprefix("**/*")
+        if sfx == norm_glob(p) or not sfx or any(ch in sfx for ch in "*?[/"):
+            return None
+        out.append(sfx)
+    return tuple(dict.fromkeys(out)) or None
+
+def _iter_candidates(cfg: ReplaceConfig) -> Iterable[tuple[Path, int]]:
     """
     Finn kandidater ut fra include/exclude + globale excludes:
     - include/exclude: globs relative til project_root
     - global_exclude_dirs: kataloger som ekskluderes (absolutt-resolvert)
     - global_exclude_files: basenavn eller globs på RELATIVE paths
+    Gir (sti, st_size) sortert som Path-objekter.
+    Én traversering per literal include-base (hele treet for '**/…'); include-globs testes
+    som én samlet regex mot relativ sti.
     """
     root = cfg.project_root
-    abs_excl_dirs = _build_abs_excluded_dirs(root, cfg.global_exclude_dirs)
-    g_rel_globs, g_rel_names = _split_rel_globs_vs_names(cfg.global_exclude_files)
-    gathered: set[Path] = set()
-    # Inkluder
-    for pat in cfg.include:
-        for p in root.glob(pat):
-            if p.is_file():
-                gathered.add(p.resolve())
-
-    # Lokal exclude-globs (rel mot root)
-    def _excluded_by_local_globs(rel_posix: str) -> bool:
-        return any(fnmatch.fnmatch(rel_posix, pat) for pat in cfg.exclude)
-
-    for p in sorted(gathered):
-        if _should_skip_by_dirs(root, abs_excl_dirs, p):
+    root_s = str(root)
+    root_prefix = os.path.join(root_s, "")  # '/x/' (og '/' for rot-katalogen)
+    abs_excl_dirs = frozenset(map(str, _build_abs_excluded_dirs(root, cfg.global_exclude_dirs)))
+    g_rel_names = cfg.g_exclude_names
+    g_rel_re = cfg.g_exclude_files_re
+    exclude_re = cfg.exclude_re
+    include_re = cfg.include_re
+    include_sfx = cfg.include_suffixes
+    if include_re is None or under_any_dir(root_s, abs_excl_dirs):
+        return
+
+    def _walks() -> Iterator[tuple[os.DirEntry[str], str, bool]]:
+        for base in _walk_bases(cfg.include):
+            if not base:
+                for entry, rel in walk_files(root_s, excl_dirs=abs_excl_dirs):
+                    yield entry, rel, entry.is_symlink()
+                continue
+            # Literale segmenter slås opp direkte (som Path.glob), også gjennom symlinker;
+            # ligger basen bak en symlink, regnes alle filer under den som symlinket
+            start = os.path.join(root_s, *base.split("/"))
+            real = os.path.realpath(start)
+            if not os.path.isdir(real) or under_any_dir(real, abs_excl_dirs):
+                continue
+            via_link = real != start
+            for entry, rel in walk_files(start, base + "/", excl_dirs=abs_excl_dirs):
+                yield entry, rel, via_link or entry.is_symlink()
+
+    found: dict[str, tuple[str, os.DirEntry[str]]] = {}
+    for entry, rel, is_link in _walks():
+        if include_sfx is not None:
+            if not rel.endswith(include_sfx):
+                continue
+        elif include_re.fullmatch(rel) is None:
             continue
+        abs_path = entry.path
+        if is_link:
+            # Symlinket fil: behandles som målet (må ligge under root og ikke i ekskludert katalog)
+            abs_path = os.path.realpath(abs_path)
+            if not abs_path.startswith(root_prefix):
+                continue
+            # realpath() gir allerede resolvert katalog → ren prefiks-sjekk, ingen resolve() per ekskludering
+            if under_any_dir(os.path.dirname(abs_path), abs_excl_dirs):
+                continue
+            rel = abs_path[len(root_prefix) :].replace(os.sep, "/")
         # global exclude (basenavn)
-        if p.name in g_rel_names:
+        if g_rel_names and rel.rpartition("/")[2] in g_rel_names:
             continue
         # global exclude (relativ glob)
-        rel = p.resolve().relative_to(root).as_posix()
-        if any(fnmatch.fnmatch(rel, g) for g in g_rel_globs):
+        if g_rel_re is not None and g_rel_re.match(rel):
             continue
         # lokal exclude (relativ glob)
-        if _excluded_by_local_globs(rel):
+        if exclude_re is not None and exclude_re.match(rel):
             continue
-        # størrelse
+        found[rel] = (abs_path, entry)
+
+    # Samme rekkefølge som sortering av Path-objekter (del for del)
+    for rel in sorted(found, key=lambda r: r.split("/")):
+        abs_path, entry = found[rel]
+        # størrelse (gis videre så lesingen kan bruke den). DirEntry.stat() mellomlagrer:
+        # for symlinker er stat() allerede gjort av is_file(), på Windows kommer den fra katalogoppslaget.
         try:
-            if p.stat().st_size > cfg.max_size:
-                continue
+            size = entry.stat().st_size
         except Exception:
             continue
-        yield p
+        if size > cfg.max_size:
+            continue
+        yield Path(abs_path), size
 
+@functools.lru_cache(maxsize=128)
 def _compile(find: str, *, regex: bool, case_sensitive: bool) -> re.Pattern[str]:
+    # Gjentatte søk fra webui/CLI med samme find/flagg gjenbruker mønsteret
     if not regex:
         find = re.escape(find)
     flags = re.MULTILINE
@@ -167,11 +253,90 @@ def _compile(find: str, *, regex: bool, case_sensitive: bool) -> re.Pattern[str]
         flags |= re.IGNORECASE
     return re.compile(find, flags)
 
-def _read_text(path: Path) -> str:
-    return path.read_text(encoding="utf-8", errors="replace")
+_REGEX_META = frozenset(".^$*+?{}[]\\|()")
+
+def _literal_of(find: str, *, regex: bool, case_sensitive: bool) -> str | None:
+    """
+    Ren streng som må finnes i teksten for at mønsteret skal treffe, eller None.
+    Gjelder case-sensitive søk der find er literal (regex=False, eller regex uten metategn).
+    """
+    if not case_sensitive:
+        return None
+    if regex and not _REGEX_META.isdisjoint(find):
+        return None
+    return find
+
+# ASCII-bokstaver som re.IGNORECASE også matcher mot ikke-ASCII-tegn (K/ſ/İ/ı);
+# et bytes-søk ville da kunne overse treff som str-søket finner
+_UNICODE_FOLDING_ASCII = frozenset("iksIKS")
+
+@functools.lru_cache(maxsize=128)
+def _bytes_gate(find: str, *, regex: bool, case_sensitive: bool) -> Callable[[bytes], object] | None:
+    """
+    Forfilter på rå bytes: returnerer falsk verdi kun når teksten garantert ikke treffer,
+    slik at filer uten treff aldri dekodes. None når find ikke kan avgjøres på bytes
+    (regex med metategn, linjeskift som normaliseres ved dekoding, U+FFFD).
+    """
+    if regex and not _REGEX_META.isdisjoint(find):
+        return None
+    if "\r" in find or "\n" in find or "\ufffd" in find:
+        return None
+    needle = find.encode("utf-8")
+    if case_sensitive:
+        return lambda raw: needle in raw
+    if find.isascii() and _UNICODE_FOLDING_ASCII.isdisjoint(find):
+        return re.compile(re.escape(needle), re.IGNORECASE).search
+    return None
+
+_SNIFF_BYTES = 4096
+
+_FADV_SEQUENTIAL = getattr(os, "POSIX_FADV_SEQUENTIAL", None)
+
+def _read_if_text(path: Path, size: int) -> bytes | None:
+    """
+    Hele filen som bytes, eller None for binærfiler (NUL i første blokk, som 'grep -I').
+    size er st_size fra kandidat-stat() og brukes til å lese resten i ett stort kall,
+    uten BufferedReader-lag. Det leses alltid til EOF (os.read kan returnere færre
+    bytes enn bedt om, f.eks. på nettverks-/FUSE-filsystemer).
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if _FADV_SEQUENTIAL is not None:
+            os.posix_fadvise(fd, 0, 0, _FADV_SEQUENTIAL)
+        head = os.read(fd, _SNIFF_BYTES)
+        if not head:
+            return head
+        if b"\x00" in head:
+            return None
+        parts = [head]
+        # +1 slik at en fil som har vokst siden stat() ikke krever et ekstra kall for å se EOF
+        want = max(size + 1 - len(head), 1 << 16)
+        while chunk := os.read(fd, want):
+            parts.append(chunk)
+            want = 1 << 16
+        return parts[0] if len(parts) == 1 else b"".join(parts)
+    finally:
+        os.close(fd)
+
+def _encode_text(text: str) -> bytes:
+    # Som write_text(encoding="utf-8"): '\n' blir os.linesep
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return text.encode("utf-8")
 
-def _write_text(path: Path, text: str) -> None:
-    path.write_text(text, encoding="utf-8")
+def _write_bytes(path: Path, data: bytes) -> None:
+    # Skriv til temp-fil og bytt inn atomisk: ny inode, så en hardlenket .bak beholder originalen.
+    # mkstemp gir et unikt navn (O_EXCL), så en eksisterende brukerfil aldri overskrives.
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    tmp = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
 
 def _make_backup(path: Path) -> Path | None:
     bak = path.with_suffix(path.suffix + ".bak")
@@ -180,8 +345,15 @@ def _make_backup(path: Path) -> Path | None:
             bak.unlink()
     except Exception:
         pass
+    # Hardlink først (ingen bytes kopieres); _write_bytes() erstatter path med ny inode.
+    # Ellers (annet filsystem, ingen link-støtte) vanlig kopi, der copyfile() bruker sendfile/fcopyfile.
+    try:
+        os.link(path, bak)
+        return bak
+    except OSError:
+        pass
     try:
-        bak.write_bytes(path.read_bytes())
+        shutil.copyfile(path, bak)
         return bak
     except Exception:
         return None
@@ -206,8 +378,12 @@ def _normalize_globs(globs: list[str] | None, filename_search: bool) -> list[str
     - rene filnavn (ingen '/', ingen jokertegn) → '**/<navn>'
     - globs som '*.py' eller 'src/*.py' beholdes som de er.
     """
+    return list(_normalize_globs_cached(tuple(globs or ()), filename_search))
+
+@functools.lru_cache(maxsize=64)
+def _normalize_globs_cached(globs: tuple[str, ...], filename_search: bool) -> tuple[str, ...]:
     out: list[str] = []
-    for g in globs or []:
+    for g in globs:
         s = g.strip()
         if not s:
             continue
@@ -216,7 +392,7 @@ def _normalize_globs(globs: list[str] | None, filename_search: bool) -> list[str
             out.append(f"**/{s}")
         else:
             out.append(s)
-    return out
+    return tuple(out)
 
 def run_replace(
     cfg: dict,
@@ -261,42 +437,90 @@ def run_replace(
         print("Ingen 'find' angitt – avbryter.")
         return
     pat = _compile(find, regex=rcfg.regex, case_sensitive=rcfg.case_sensitive)
-    files_considered = 0
+    literal = _literal_of(find, regex=rcfg.regex, case_sensitive=rcfg.case_sensitive)
+    gate = _bytes_gate(find, regex=rcfg.regex, case_sensitive=rcfg.case_sensitive)
+    # Uten backslash er erstatningen ingen mal (\1, \g<navn>, \n) → kan brukes direkte i str.replace
+    literal_repl = "\\" not in replace
     files_changed = 0
     total_replacements = 0
     _print_header(rcfg, find, replace)
-    for path in _iter_candidates(rcfg):
-        files_considered += 1
+
+    def _scan(cand: tuple[Path, int]) -> tuple[int, str | None, str | None, bytes | None] | None:
+        """
+        Les → søk → erstatt → kod én fil i samme tråd (ingen utskrift). Gir (treff, før, etter, bytes)
+        der kun det hovedtråden trenger beholdes: tekstene ved diff, ferdig kodede bytes ved skriving.
+        None = ingen treff/ulesbar.
+        """
         try:
-            before = _read_text(path)
+            raw = _read_if_text(*cand)
         except Exception:
-            continue
-        new_text, n = pat.subn(replace, before)
+            return None
+        if raw is None:
+            return None
+        # Søk på rå bytes først; dekod kun filer som kan inneholde treff
+        if gate is not None and not gate(raw):
+            return None
+        before = decode_text(raw)
+        # De fleste filer treffer ikke: avgjør det med 'in'/search() før subn() bygger ny streng
+        if literal is not None:
+            if literal not in before:
+                return None
+            if literal_repl:
+                # Ren streng inn og ut: str.count/replace (C) i stedet for regex-motoren
+                n = before.count(literal)
+                new_text = before.replace(literal, replace)
+            else:
+                new_text, n = pat.subn(replace, before)
+        elif pat.search(before) is None:
+            return None
+        else:
+            new_text, n = pat.subn(replace, before)
         if n <= 0:
-            continue
-        files_changed += 1
-        total_replacements += n
-        rel = path.resolve().relative_to(rcfg.project_root).as_posix()
-        print(f"⟳ {rel}  ({n} treff)")
+            return None
+        data = None
+        if not rcfg.dry_run:
+            try:
+                data = _encode_text(new_text)
+            except UnicodeEncodeError:
+                pass  # feilen rapporteres når hovedtråden prøver å skrive
         if rcfg.show_diff:
-            diff = difflib.unified_diff(
-                before.splitlines(keepends=True),
-                new_text.splitlines(keepends=True),
-                fromfile=f"{rel} (før)",
-                tofile=f"{rel} (etter)",
-                lineterm="",
-                n=3,
-            )
-            for line in diff:
-                print(line, end="")
-        if rcfg.dry_run:
-            continue
-        if rcfg.backup:
-            _make_backup(path)
-        try:
-            _write_text(path, new_text)
-        except Exception as e:
-            print(f"[ADVARSEL] Klarte ikke å skrive {rel}: {e}")
+            return n, before, new_text, data
+        return n, None, (new_text if data is None and not rcfg.dry_run else None), data
+
+    candidates = list(_iter_candidates(rcfg))
+    root_prefix = os.path.join(str(rcfg.project_root), "")
+    files_considered = len(candidates)
+    # Lesing og regex overlappes i en trådpool; utskrift/skriving skjer i rekkefølge her
+    workers = max(1, min(32, (os.cpu_count() or 1) * 4, len(candidates)))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for (path, _size), res in zip(candidates, ex.map(_scan, candidates)):
+            if res is None:
+                continue
+            n, before, new_text, data = res
+            files_changed += 1
+            total_replacements += n
+            # Kandidatene er allerede resolvert under root → relativ sti ved ren slicing
+            rel = str(path)[len(root_prefix) :].replace(os.sep, "/")
+            print(f"⟳ {rel}  ({n} treff)")
+            if rcfg.show_diff and before is not None and new_text is not None:
+                diff = difflib.unified_diff(
+                    before.splitlines(keepends=True),
+                    new_text.splitlines(keepends=True),
+                    fromfile=f"{rel} (før)",
+                    tofile=f"{rel} (etter)",
+                    lineterm="",
+                    n=3,
+                )
+                # Én writelines() i stedet for print() per linje
+                sys.stdout.writelines(diff)
+            if rcfg.dry_run:
+                continue
+            if rcfg.backup:
+                _make_backup(path)
+            try:
+                _write_bytes(path, data if data is not None else _encode_text(new_text or ""))
+            except Exception as e:
+                print(f"[ADVARSEL] Klarte ikke å skrive {rel}: {e}")
     print("\n=== Oppsummert ===")
     print(f"Filer vurdert : {files_considered}")
     print(f"Filer endret  : {files_changed}")
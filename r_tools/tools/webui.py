@@ -1,18 +1,22 @@
 # ./tools/r_tools/tools/webui.py
 from __future__ import annotations
 
+import asyncio
+import functools
 import io
 import json
 import os
+import queue
 import re
-import subprocess
+import stat
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import redirect_stdout
 from pathlib import Path
-from typing import Any, TypedDict
+from typing import Any, Callable, Iterable, TypedDict
 
 from fastapi import Body, FastAPI, HTTPException, Query
-from fastapi.responses import HTMLResponse, JSONResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from starlette.middleware.gzip import GZipMiddleware
@@ -28,6 +32,11 @@ from .gh_raw import run_gh_raw
 from .paste_chunks import run_paste
 from .replace_code import run_replace
 
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
 # ──────────────────────────────────────────────────────────────────────────────
 #  Konstanter og mapper
 # ──────────────────────────────────────────────────────────────────────────────
@@ -40,21 +49,54 @@ print(f"[webui] TOOLS_ROOT = {TOOLS_ROOT}")
 print(f"[webui] CONFIG_DIR = {CONFIG_DIR}  (env RTOOLS_CONFIG_DIR={os.environ.get('RTOOLS_CONFIG_DIR')!r})")
 print(f"[webui] projects_config.json exists? {(CONFIG_DIR / 'projects_config.json').is_file()}")
 
+# ──────────────────────────────────────────────────────────────────────────────
+#  JSON (orjson valgfri: raskere parse/serialisering, ellers stdlib)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _json_loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except Exception:
+            pass  # stdlib godtar mer (NaN, store heltall) og gir de vante feilmeldingene
+    return json.loads(data)
+
+def _json_line(obj: Any) -> bytes:
+    """Kompakt JSON + linjeskift (NDJSON)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+def _json_pretty(obj: Any) -> str:
+    """Som json.dumps(obj, indent=2, ensure_ascii=False) + '\\n'."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE).decode("utf-8")
+        except Exception:
+            pass
+    return json.dumps(obj, indent=2, ensure_ascii=False) + "\n"
+
 # ──────────────────────────────────────────────────────────────────────────────
 #  Forhåndsinnlastet HTML hvis du har egen webui_app/index.html
 # ──────────────────────────────────────────────────────────────────────────────
 
-def _read_text_safe(path: Path) -> str:
-    try:
-        return path.read_text(encoding="utf-8")
-    except Exception:
-        return ""
+# Leses én gang per versjon av filen (nøkkel: mtime_ns/størrelse) og holdes i minnet;
+# GET / koster da én stat() og ingen lesing. Komprimering overlates til GZipMiddleware.
+
+@functools.lru_cache(maxsize=2)
+def _load_index_html(idx: Path, mtime_ns: int, size: int) -> bytes:
+    return idx.read_bytes()
 
-def _external_index_html() -> str | None:
+def _external_index_html() -> bytes | None:
+    """Innholdet i webui_app/index.html, eller None hvis den mangler/ikke kan leses."""
     idx = WEBUI_DIR / "index.html"
-    if idx.is_file():
-        return _read_text_safe(idx)
-    return None
+    key = _file_key(idx)
+    if key is None:
+        return None
+    try:
+        return _load_index_html(idx, *key)
+    except Exception:
+        return None
 
 # ──────────────────────────────────────────────────────────────────────────────
 #  Enkle typer
@@ -70,39 +112,86 @@ class ProjectEntry(TypedDict):
 #  Hjelpere for “projects”/“recipes”
 # ──────────────────────────────────────────────────────────────────────────────
 
-def _load_projects() -> list[ProjectEntry]:
-    cfg_path = CONFIG_DIR / "projects_config.json"
-    if not cfg_path.is_file():
-        raise FileNotFoundError(f"Fant ikke {cfg_path}")
-    data = json.loads(cfg_path.read_text(encoding="utf-8"))
+# Config-filene endres sjelden: parse + resolve caches per (sti, mtime_ns, størrelse).
+# En ny stat() per kall er nok til å oppdage endringer.
+
+def _file_key(path: Path) -> tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return st.st_mtime_ns, st.st_size
+
+@functools.lru_cache(maxsize=4)
+def _parse_projects(cfg_path: Path, mtime_ns: int, size: int) -> tuple[tuple[str, str, str], ...]:
+    data = _json_loads(cfg_path.read_bytes())
     projects = data.get("projects")
     if not isinstance(projects, list):
         raise ValueError(f"{cfg_path}: 'projects' må være en liste")
-    out: list[ProjectEntry] = []
+    out: list[tuple[str, str, str]] = []
     for i, p in enumerate(projects):
         if not isinstance(p, dict) or "name" not in p or "path" not in p:
             raise ValueError(f"{cfg_path}: item[{i}] mangler 'name' eller 'path'")
         raw_path = str(p["path"])
         base = TOOLS_ROOT
         abs_path = (Path(raw_path).expanduser() if Path(raw_path).is_absolute() else (base / raw_path)).resolve()
-        out.append(ProjectEntry(name=str(p["name"]), path=raw_path, abs_path=str(abs_path), exists=abs_path.exists()))
+        out.append((str(p["name"]), raw_path, str(abs_path)))
     if not out:
         raise ValueError(f"{cfg_path}: 'projects' er tom")
-    return out
+    return tuple(out)
+
+def _load_projects() -> list[ProjectEntry]:
+    cfg_path = CONFIG_DIR / "projects_config.json"
+    key = _file_key(cfg_path)
+    if key is None:
+        raise FileNotFoundError(f"Fant ikke {cfg_path}")
+    # 'exists' sjekkes på nytt hver gang – prosjektmapper kan opprettes/fjernes uten at config endres
+    return [
+        ProjectEntry(name=name, path=raw_path, abs_path=abs_path, exists=os.path.exists(abs_path))
+        for name, raw_path, abs_path in _parse_projects(cfg_path, *key)
+    ]
+
+@functools.lru_cache(maxsize=4)
+def _parse_recipes(rc: Path, mtime_ns: int, size: int) -> tuple[dict[str, Any], ...]:
+    data = _json_loads(rc.read_bytes())
+    return tuple(data.get("recipes", []))
 
 def _load_recipes() -> list[dict[str, Any]]:
     rc = CONFIG_DIR / "recipes_config.json"
-    if not rc.is_file():
+    key = _file_key(rc)
+    if key is None:
         return []
-    data = json.loads(rc.read_text(encoding="utf-8"))
-    return list(data.get("recipes", []))
+    return list(_parse_recipes(rc, *key))
 
 # ──────────────────────────────────────────────────────────────────────────────
 #  Stdout-fangst
 # ──────────────────────────────────────────────────────────────────────────────
 
+class _ListWriter(io.TextIOBase):
+    """Tekst-sink som bare samler fragmentene i en liste; join-es én gang til slutt.
+    Billigere enn StringIO for mange små print() fra verktøyene."""
+
+    def __init__(self) -> None:
+        self.parts: list[str] = []
+        self._append = self.parts.append
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self._append(s)
+        return len(s)
+
+    def writelines(self, lines: Iterable[str]) -> None:
+        self.parts.extend(lines)
+
+    def getvalue(self) -> str:
+        return "".join(self.parts)
+
 def _capture(fn, *args, **kwargs) -> str:
-    buf = io.StringIO()
+    buf = _ListWriter()
     with redirect_stdout(buf):
         fn(*args, **kwargs)
     return buf.getvalue()
@@ -110,12 +199,17 @@ def _capture(fn, *args, **kwargs) -> str:
 def _safe_clean_paste_out(out_dir: Path) -> None:
     try:
         out_dir.mkdir(parents=True, exist_ok=True)
-        for p in out_dir.glob("paste_*.txt"):
-            try:
-                if p.is_file() or p.is_symlink():
-                    p.unlink(missing_ok=True)
-            except Exception:
-                pass
+        # én scandir-runde; DirEntry har filtypen fra d_type, så ingen ekstra stat() per fil
+        with os.scandir(out_dir) as it:
+            for ent in it:
+                name = ent.name
+                if not (name.startswith("paste_") and name.endswith(".txt")):
+                    continue
+                try:
+                    if ent.is_file(follow_symlinks=False) or ent.is_symlink():
+                        os.unlink(ent.path)
+                except Exception:
+                    pass
     except Exception:
         pass
 
@@ -126,6 +220,19 @@ def _safe_clean_paste_out(out_dir: Path) -> None:
 LAST_FORMAT_SUMMARY: dict[str, int] = {}
 LAST_PASTE_SUMMARY: dict[str, int] = {}
 
+# Forhåndskompilerte mønstre for metrikk-parsing (brukes etter hver format-/paste-kjøring)
+_RE_BLACK = re.compile(r"\b(\d+)\s+files reformat(?:ted|ted,)", re.IGNORECASE)
+_RE_RUFF = re.compile(r"Found\s+\d+\s+errors\s+\((\d+)\s+fixed,\s+(\d+)\s+remaining\)", re.IGNORECASE)
+_RE_CLEANUP = re.compile(r"Cleanup:\s+(\d+)\/(\d+)\s+filer endret", re.IGNORECASE)
+
+# Paste-markører (ASCII) – telles direkte på bytes, uten dekoding
+_BEGIN_FILE = b"===== BEGIN FILE ====="
+_BEGIN_CODE = "----- BEGIN CODE -----"
+_END_CODE = "----- END CODE -----"
+# Linjeskift som str.splitlines() deler på i tillegg til '\n' (UTF-8-kodet); finnes noen av dem,
+# telles kodelinjer via tekst for å gi nøyaktig samme svar
+_OTHER_LINE_BREAKS = (b"\r", b"\x0b", b"\x0c", b"\x1c", b"\x1d", b"\x1e", b"\xc2\x85", b"\xe2\x80\xa8", b"\xe2\x80\xa9")
+
 def _parse_format_metrics(output: str) -> dict[str, int]:
     """
     Trekk ut nyttige metrikker fra run_format-output.
@@ -142,12 +249,12 @@ def _parse_format_metrics(output: str) -> dict[str, int]:
     cleanup_total = 0
 
     # Black
-    m = re.search(r"\b(\d+)\s+files reformat(?:ted|ted,)", output, flags=re.IGNORECASE)
+    m = _RE_BLACK.search(output)
     if m:
         black = int(m.group(1))
 
     # Ruff (nyttig linje: 'Found 67 errors (67 fixed, 0 remaining).')
-    m = re.search(r"Found\s+\d+\s+errors\s+\((\d+)\s+fixed,\s+(\d+)\s+remaining\)", output, flags=re.IGNORECASE)
+    m = _RE_RUFF.search(output)
     if m:
         ruff_fixed = int(m.group(1))
         ruff_remaining = int(m.group(2))
@@ -160,7 +267,7 @@ def _parse_format_metrics(output: str) -> dict[str, int]:
                 prettier += 1
 
     # Cleanup
-    m = re.search(r"Cleanup:\s+(\d+)\/(\d+)\s+filer endret", output, flags=re.IGNORECASE)
+    m = _RE_CLEANUP.search(output)
     if m:
         cleanup_changed = int(m.group(1))
         cleanup_total = int(m.group(2))
@@ -174,6 +281,63 @@ def _parse_format_metrics(output: str) -> dict[str, int]:
         "cleanup_total": cleanup_total,
     }
 
+def _count_code_lines_text(txt: str) -> int:
+    # tell kode-linjer mellom BEGIN/END CODE
+    n = 0
+    in_code = False
+    for ln in txt.splitlines():
+        if ln.strip() == _BEGIN_CODE:
+            in_code = True
+            continue
+        if ln.strip() == _END_CODE:
+            in_code = False
+            continue
+        if in_code:
+            n += 1
+    return n
+
+def _count_code_lines(data: bytes) -> int:
+    """
+    Antall linjer mellom '----- BEGIN CODE -----' og '----- END CODE -----' (som
+    _count_code_lines_text), men på bytes: markørlinjene finnes med find(), og linjene
+    mellom dem telles med count(b"\\n") – ingen dekoding eller Python-løkke per linje.
+    """
+    if any(sep in data for sep in _OTHER_LINE_BREAKS):
+        return _count_code_lines_text(data.decode("utf-8", errors="replace"))
+    markers: list[tuple[int, int, bool]] = []  # (linjestart, linjeslutt, er_begin)
+    for marker, is_begin in ((_BEGIN_CODE, True), (_END_CODE, False)):
+        needle = marker.encode("ascii")
+        i = data.find(needle)
+        while i >= 0:
+            ls = data.rfind(b"\n", 0, i) + 1
+            le = data.find(b"\n", i)
+            if le < 0:
+                le = len(data)
+            # kun hele linjer (ev. med blanktegn rundt) er markører; dekod bare denne linjen
+            if data[ls:le].decode("utf-8", errors="replace").strip() == marker:
+                markers.append((ls, le, is_begin))
+            i = data.find(needle, le)
+    markers.sort()
+    total = 0
+    start: int | None = None  # byte-offset der nåværende kodeområde starter
+    for ls, le, is_begin in markers:
+        if start is not None:
+            total += data.count(b"\n", start, ls)
+        start = le + 1 if is_begin else None
+    if start is not None and start < len(data):
+        # siste område går til EOF; splitlines() teller også en siste linje uten '\n'
+        total += data.count(b"\n", start) + (0 if data.endswith(b"\n") else 1)
+    return total
+
+def _scan_one_paste_file(pf: Path) -> tuple[int, int]:
+    """(seksjoner, kodelinjer) for én paste-fil; (0, 0) hvis den ikke kan leses."""
+    try:
+        data = pf.read_bytes()
+    except Exception:
+        return 0, 0
+    # '^' i MULTILINE = filstart eller rett etter '\n'
+    return data.count(b"\n" + _BEGIN_FILE) + data.startswith(_BEGIN_FILE), _count_code_lines(data)
+
 def _compute_paste_metrics(out_dir: Path) -> dict[str, int]:
     """
     Les alle paste_*.txt og beregn:
@@ -188,24 +352,15 @@ def _compute_paste_metrics(out_dir: Path) -> dict[str, int]:
     files = sorted(out_dir.glob("paste_*.txt"))
     paste_files = len(files)
 
-    for pf in files:
-        try:
-            txt = pf.read_text(encoding="utf-8", errors="replace")
-        except Exception:
-            continue
-        paste_file_sections += len(re.findall(r"^===== BEGIN FILE =====", txt, flags=re.MULTILINE))
-
-        # tell kode-linjer mellom BEGIN/END CODE
-        in_code = False
-        for ln in txt.splitlines():
-            if ln.strip() == "----- BEGIN CODE -----":
-                in_code = True
-                continue
-            if ln.strip() == "----- END CODE -----":
-                in_code = False
-                continue
-            if in_code:
-                paste_code_lines += 1
+    # Lesing og bytes-skanning slipper GIL → flere filer overlappes i en liten trådpool
+    if len(files) >= 4:
+        with ThreadPoolExecutor(max_workers=min(8, len(files))) as ex:
+            results = list(ex.map(_scan_one_paste_file, files))
+    else:
+        results = [_scan_one_paste_file(pf) for pf in files]
+    for sections, code_lines in results:
+        paste_file_sections += sections
+        paste_code_lines += code_lines
 
     return {
         "paste_files": paste_files,
@@ -217,7 +372,7 @@ def _compute_paste_metrics(out_dir: Path) -> dict[str, int]:
 #  FastAPI-app
 # ──────────────────────────────────────────────────────────────────────────────
 
-app = FastAPI(title="r_tools UI", default_response_class=JSONResponse)
+app = FastAPI(title="r_tools UI", default_response_class=ORJSONResponse if orjson is not None else JSONResponse)
 app.add_middleware(GZipMiddleware, minimum_size=600)
 
 if (WEBUI_DIR / "static").is_dir():
@@ -293,25 +448,24 @@ def api_clean_targets_set(project: str | None = Query(None), body: dict[str, Any
         raise HTTPException(status_code=400, detail="targets må være et objekt")
     path = CONFIG_DIR / "clean_config.json"
     if path.is_file():
-        data = json.loads(path.read_text(encoding="utf-8"))
+        data = _json_loads(path.read_bytes())
         if "clean" not in data or not isinstance(data["clean"], dict):
             data["clean"] = {}
     else:
         data = {"clean": {}}
     data["clean"]["targets"] = targets
-    path.write_text(json.dumps(data, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    path.write_text(_json_pretty(data), encoding="utf-8")
     return {"ok": True, "message": f"Lagret targets til {path}"}
 
 # -------- Git hjelpe-endepunkt (remotes/branches) --------
 @app.get("/api/git/branches")
 def api_git_branches(project: str | None = Query(None)):
-    from .git_tools import current_branch, list_branches
+    from .git_tools import branches_with_current
 
     cfg = load_config("git_config.json", Path(project).resolve() if project else None, None)
     root = Path(cfg.get("project_root", ".")).resolve()
     try:
-        arr = list_branches(root)
-        cur = current_branch(root)
+        arr, cur = branches_with_current(root)
         return {"branches": arr, "current": cur}
     except Exception as e:
         return {"error": f"{type(e).__name__}: {e}", "branches": [], "current": None}
@@ -348,20 +502,13 @@ def api_gh_raw_repo_info(project: str | None = Query(None), remote: str | None =
     proj = Path(project).resolve()
 
     try:
-        # Lokal småhjelpere for git
-        def _run_git(*args: str) -> tuple[int, str]:
-            proc = subprocess.run(
-                ["git", *args],
-                cwd=str(proj),
-                text=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-            )
-            return proc.returncode, proc.stdout
+        from .git_tools import branches_with_current
+        from .git_tools import remote_url as _remote_url
 
-        # Sjekk repo
-        rc, out = _run_git("rev-parse", "--is-inside-work-tree")
-        if rc != 0 or "true" not in (out or ""):
+        # Repo-sjekk + brancher + gjeldende i ett oppslag (én git-prosess, eller pygit2 uten prosess)
+        try:
+            branches, cur = branches_with_current(proj)
+        except RuntimeError:
             return {
                 "error": f"Ikke et git-repo: {proj}",
                 "owner": None,
@@ -370,10 +517,11 @@ def api_gh_raw_repo_info(project: str | None = Query(None), remote: str | None =
                 "current_branch": None,
                 "branches": [],
             }
+        current = cur or None
 
         # Hent remote URL
-        rc, remote_url = _run_git("remote", "get-url", remote or "origin")
-        if rc != 0:
+        remote_url = _remote_url(proj, remote or "origin")
+        if remote_url is None:
             return {
                 "error": f"Fant ikke remote {(remote or 'origin')!r}",
                 "owner": None,
@@ -382,8 +530,6 @@ def api_gh_raw_repo_info(project: str | None = Query(None), remote: str | None =
                 "current_branch": None,
                 "branches": [],
             }
-        remote_url = (remote_url or "").strip()
-
         # Parse owner/repo
         try:
             from .gh_raw import _parse_github_remote  # gjenbruk parser
@@ -399,13 +545,6 @@ def api_gh_raw_repo_info(project: str | None = Query(None), remote: str | None =
                 "branches": [],
             }
 
-        # Branches + current
-        rc, cur = _run_git("rev-parse", "--abbrev-ref", "HEAD")
-        current = (cur or "").strip() if rc == 0 else None
-
-        rc, b_out = _run_git("branch", "--format", "%(refname:short)")
-        branches = [ln.strip() for ln in (b_out or "").splitlines() if ln.strip()] if rc == 0 else []
-
         return {
             "owner": owner,
             "repo": repo,
@@ -424,8 +563,8 @@ def api_gh_raw_repo_info(project: str | None = Query(None), remote: str | None =
             "branches": [],
         }
 
-@app.post("/api/run")
-def api_run(body: RunPayload):
+def _run_tool(body: RunPayload, capture: Callable[..., str] = _capture) -> dict[str, Any]:
+    """Felles kjerne for /api/run og /api/run-stream; `capture` bestemmer hvor stdout havner."""
     tool = body.tool
     project_path = Path(body.project).resolve() if body.project else None
     args = body.args or {}
@@ -450,7 +589,7 @@ def api_run(body: RunPayload):
             if "case_sensitive" in args:
                 ov["case_insensitive"] = not bool(args.get("case_sensitive"))
             cfg = load_config(tool_cfg, project_path, ov or None)
-            out = _capture(
+            out = capture(
                 run_search,
                 cfg=cfg,
                 terms=(args.get("terms") or None),
@@ -528,7 +667,7 @@ def api_run(body: RunPayload):
             if not list_only:
                 _safe_clean_paste_out(out_path)
 
-            out = _capture(run_paste, cfg=cfg, list_only=list_only)
+            out = capture(run_paste, cfg=cfg, list_only=list_only)
 
             # Beregn metrikker etter kjøring (kun når vi faktisk genererer filer)
             metrics: dict[str, int] = {}
@@ -539,13 +678,14 @@ def api_run(body: RunPayload):
             LAST_PASTE_SUMMARY = dict(metrics or {})
             # legg ved enkel tekstlig oppsummering nederst i stdout
             if metrics:
-                out = (
-                    out.rstrip("\n")
-                    + "\n\n== Sammendrag (paste) ==\n"
-                    + f"Paste-filer: {metrics.get('paste_files', 0)}\n"
-                    + f"Seksjoner   : {metrics.get('paste_file_sections', 0)}\n"
-                    + f"Kodelinjer  : {metrics.get('paste_code_lines', 0)}\n"
-                )
+                # én join: store output kopieres bare én gang
+                out = "".join([
+                    out.rstrip("\n"),
+                    "\n\n== Sammendrag (paste) ==\n",
+                    f"Paste-filer: {metrics.get('paste_files', 0)}\n",
+                    f"Seksjoner   : {metrics.get('paste_file_sections', 0)}\n",
+                    f"Kodelinjer  : {metrics.get('paste_code_lines', 0)}\n",
+                ])
             dt = int((time.time() - t0) * 1000)
             return {"output": out, "summary": {"rc": 0, "duration_ms": dt, **metrics}}
         elif tool == "gh-raw":
@@ -586,7 +726,7 @@ def api_run(body: RunPayload):
                 # wrap_read også mulig via config om UI ikke sendte
                 wrap = bool(wrap or (cfg.get("gh_raw", {}) or {}).get("wrap_read", False))
 
-            out = _capture(run_gh_raw, cfg=cfg, wrap_read=wrap)
+            out = capture(run_gh_raw, cfg=cfg, wrap_read=wrap)
             dt = int((time.time() - t0) * 1000)
             return {"output": out, "summary": {"rc": 0, "duration_ms": dt}}
         elif tool == "format":
@@ -594,7 +734,7 @@ def api_run(body: RunPayload):
             override = args.get("override") or None
             if isinstance(override, dict):
                 cfg = deep_merge(cfg, override)
-            out = _capture(run_format, cfg=cfg, dry_run=bool(args.get("dry_run", False)))
+            out = capture(run_format, cfg=cfg, dry_run=bool(args.get("dry_run", False)))
 
             metrics = _parse_format_metrics(out)
 
@@ -603,14 +743,14 @@ def api_run(body: RunPayload):
             LAST_FORMAT_SUMMARY = dict(metrics or {})
 
             if metrics:
-                out = (
-                    out.rstrip("\n")
-                    + "\n\n== Sammendrag ==\n"
-                    + f"Prettier: {metrics.get('prettier_formatted', 0)} filer formatert\n"
-                    + f"Black:    {metrics.get('black_reformatted', 0)} filer reformattet\n"
-                    + f"Ruff:     {metrics.get('ruff_fixed', 0)} fikset, {metrics.get('ruff_remaining', 0)} gjenstår\n"
-                    + f"Cleanup:  {metrics.get('cleanup_changed', 0)}/{metrics.get('cleanup_total', 0)} filer endret\n"
-                )
+                out = "".join([
+                    out.rstrip("\n"),
+                    "\n\n== Sammendrag ==\n",
+                    f"Prettier: {metrics.get('prettier_formatted', 0)} filer formatert\n",
+                    f"Black:    {metrics.get('black_reformatted', 0)} filer reformattet\n",
+                    f"Ruff:     {metrics.get('ruff_fixed', 0)} fikset, {metrics.get('ruff_remaining', 0)} gjenstår\n",
+                    f"Cleanup:  {metrics.get('cleanup_changed', 0)}/{metrics.get('cleanup_total', 0)} filer endret\n",
+                ])
             dt = int((time.time() - t0) * 1000)
             rc = 0
             if "Traceback (most recent call last)" in out or "[error]" in out:
@@ -628,7 +768,7 @@ def api_run(body: RunPayload):
             mode = (args.get("mode") or "dry").lower()
             perform = mode == "apply"
             dry_run = not perform
-            out = _capture(run_clean, cfg=cfg, only=args.get("what") or None, skip=args.get("skip") or [], dry_run=dry_run)
+            out = capture(run_clean, cfg=cfg, only=args.get("what") or None, skip=args.get("skip") or [], dry_run=dry_run)
             dt = int((time.time() - t0) * 1000)
             return {"output": out, "summary": {"rc": 0, "duration_ms": dt}}
         elif tool == "backup":
@@ -641,7 +781,7 @@ def api_run(body: RunPayload):
                 if k_src in args and args[k_src] not in (None, "", []):
                     rov["replace"][k_dst] = args[k_src]
             cfg = load_config(tool_cfg, project_path, rov if rov["replace"] else None)
-            out = _capture(
+            out = capture(
                 run_replace,
                 cfg=cfg,
                 find=args.get("find", ""),
@@ -671,6 +811,96 @@ def api_run(body: RunPayload):
         dt = int((time.time() - t0) * 1000)
         return {"error": f"{type(e).__name__}: {e}", "summary": {"rc": 1, "duration_ms": dt}}
 
+@app.post("/api/run")
+def api_run(body: RunPayload):
+    return _run_tool(body)
+
+class _QueueWriter(io.TextIOBase):
+    """
+    Tekst-sink for streaming: hvert fragment sendes rett videre til køen og holdes ikke i minnet.
+    Med keep=True samles teksten i tillegg (kun run_format: metrikker og rc leses fra output).
+    """
+
+    def __init__(self, q: queue.SimpleQueue, keep: bool = False) -> None:
+        self._put = q.put
+        self._kept: list[str] | None = [] if keep else None
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        if s:
+            self._put(s)
+            if self._kept is not None:
+                self._kept.append(s)
+        return len(s)
+
+    def writelines(self, lines: Iterable[str]) -> None:
+        for s in lines:
+            self.write(s)
+
+    def getvalue(self) -> str:
+        return "".join(self._kept) if self._kept is not None else ""
+
+_STREAM_DONE = object()
+
+@app.post("/api/run-stream")
+async def api_run_stream(body: RunPayload):
+    """Som /api/run, men output strømmes som NDJSON mens verktøyet kjører:
+    én linje {"chunk": "..."} per bolk og til slutt {"summary": {...}} (ev. med "error").
+    Sammendragsteksten som /api/run legger nederst i output sendes ikke; tallene ligger i summary.
+    Output holdes ikke i minnet (unntak: format, der metrikkene parses fra teksten)."""
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    streamed = False
+
+    def capture(fn, *args, **kwargs) -> str:
+        nonlocal streamed
+        streamed = True
+        buf = _QueueWriter(q, keep=fn is run_format)
+        with redirect_stdout(buf):
+            fn(*args, **kwargs)
+        return buf.getvalue()
+
+    def work() -> dict[str, Any]:
+        try:
+            return _run_tool(body, capture=capture)
+        finally:
+            q.put(_STREAM_DONE)
+
+    async def gen():
+        task = asyncio.create_task(asyncio.to_thread(work))
+        done = False
+        while not done:
+            # blokkér (i tråd) til første fragment, og ta så med alt som allerede ligger i køen
+            parts: list[str] = []
+            item = await asyncio.to_thread(q.get)
+            while True:
+                if item is _STREAM_DONE:
+                    done = True
+                    break
+                parts.append(item)
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+            if parts:
+                yield _json_line({"chunk": "".join(parts)})
+        res = await task
+        # verktøy som ikke går via capture (backup/git) har bare ferdig output
+        if not streamed and res.get("output"):
+            yield _json_line({"chunk": res["output"]})
+        tail: dict[str, Any] = {"summary": res.get("summary", {})}
+        if "error" in res:
+            tail["error"] = res["error"]
+        yield _json_line(tail)
+
+    # Content-Encoding settes så GZipMiddleware ikke holder igjen små bolker i kompressoren
+    return StreamingResponse(
+        gen(),
+        media_type="application/x-ndjson",
+        headers={"Content-Encoding": "identity", "Cache-Control": "no-cache"},
+    )
+
 @app.post("/api/format-preview")
 def api_format_preview(body: PreviewPayload):
     project_path = Path(body.project).resolve() if body.project else None
@@ -778,10 +1008,10 @@ def api_config_get(name: str = Query(..., description="Filnavn i whitelist")):
         return {"name": name, "path": str(p), "exists": False, "content": "", "json": None}
     txt = p.read_text(encoding="utf-8")
     try:
-        parsed = json.loads(txt)
+        parsed = _json_loads(txt)
     except Exception as e:
         return {"name": name, "path": str(p), "exists": True, "content": txt, "json_error": str(e)}
-    return {"name": name, "path": str(p), "exists": True, "content": json.dumps(parsed, indent=2, ensure_ascii=False) + "\n"}
+    return {"name": name, "path": str(p), "exists": True, "content": _json_pretty(parsed)}
 
 @app.post("/api/config")
 def api_config_put(name: str = Query(..., description="Filnavn i whitelist"), body: dict[str, Any] = Body(...)):
@@ -790,10 +1020,10 @@ def api_config_put(name: str = Query(..., description="Filnavn i whitelist"), bo
     if not isinstance(content, str):
         raise HTTPException(status_code=400, detail="content må være streng")
     try:
-        parsed = json.loads(content)
+        parsed = _json_loads(content)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Ugyldig JSON: {e}")
-    p.write_text(json.dumps(parsed, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    p.write_text(_json_pretty(parsed), encoding="utf-8")
     return {"ok": True, "name": name, "path": str(p)}
 
 @app.get("/favicon.ico")
@@ -813,14 +1043,14 @@ def api_settings():
     g = {}
     if global_path.is_file():
         try:
-            g = json.loads(global_path.read_text(encoding="utf-8")) or {}
+            g = _json_loads(global_path.read_bytes()) or {}
         except Exception:
             g = {}
     backup_path = cfg_dir / "backup_config.json"
     b = {}
     if backup_path.is_file():
         try:
-            bb = json.loads(backup_path.read_text(encoding="utf-8")) or {}
+            bb = _json_loads(backup_path.read_bytes()) or {}
             b["script"] = (bb.get("backup", {}) or {}).get("script")
         except Exception:
             b = {}
@@ -839,17 +1069,17 @@ def api_settings_save(body: dict[str, Any]):
     # global_config.json
     global_path = cfg_dir / "global_config.json"
     try:
-        g = json.loads(global_path.read_text(encoding="utf-8")) if global_path.is_file() else {}
+        g = _json_loads(global_path.read_bytes()) if global_path.is_file() else {}
     except Exception:
         g = {}
     g["default_project"] = body.get("default_project") or None
     g["default_tool"] = body.get("default_tool") or None
-    global_path.write_text(json.dumps(g, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    global_path.write_text(_json_pretty(g), encoding="utf-8")
 
     # backup_config.json (kun script)
     backup_path = cfg_dir / "backup_config.json"
     try:
-        b_all = json.loads(backup_path.read_text(encoding="utf-8")) if backup_path.is_file() else {}
+        b_all = _json_loads(backup_path.read_bytes()) if backup_path.is_file() else {}
     except Exception:
         b_all = {}
     b_all.setdefault("backup", {})
@@ -857,7 +1087,7 @@ def api_settings_save(body: dict[str, Any]):
         b_all["backup"].pop("script", None)
     else:
         b_all["backup"]["script"] = body.get("backup_script")
-    backup_path.write_text(json.dumps(b_all, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    backup_path.write_text(_json_pretty(b_all), encoding="utf-8")
 
     return {"ok": True}
 
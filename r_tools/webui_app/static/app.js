@@ -297,7 +297,7 @@ if (elGitAcp)
       const precheck_tests = document.getElementById('git_precheck_tests')?.checked || false
       return runTool(
         'git',
-        { args: { action: 'acp', branch, remote, message: msg, confirm: confirmProtected, precheck, precheck_tests } },
+        { args: { action: 'acp', branch, remote, message: msg, confirm: confirmProtected, precheck, precheck_tests, status: true } },
         'out_git'
       )
     })
@@ -307,7 +307,7 @@ if (elGitDiff)
   elGitDiff.onclick = () =>
     withStatus('git', 'out_git', async () => {
       const staged = document.getElementById('git_staged')?.checked || false
-      return runTool('git', { args: { action: 'diff', staged } }, 'out_git')
+      return runTool('git', { args: { action: 'diff', staged, pretty: true } }, 'out_git')
     })
 
 const elGitLog = document.getElementById('git_log')
@@ -315,7 +315,7 @@ if (elGitLog)
   elGitLog.onclick = () =>
     withStatus('git', 'out_git', async () => {
       const n = parseInt(document.getElementById('git_log_n')?.value || '10', 10)
-      return runTool('git', { args: { action: 'log', n } }, 'out_git')
+      return runTool('git', { args: { action: 'log', n, pretty: true } }, 'out_git')
     })
 
 const elGitResolve = document.getElementById('git_resolve')